@@ -0,0 +1,54 @@
+"""Benchmark memory use of location.cluster_locations.
+
+Clusters n random points spread over a city-sized area, and reports the
+peak memory allocated (as measured by tracemalloc, which includes numpy
+arrays).  The sparse neighbor graph grows linearly with n, while the
+dense distance matrix used before grows quadratically.  Run with::
+
+    python benchmarks/cluster_locations.py
+"""
+
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+
+from niimpy.preprocessing import location
+
+
+def cluster_locations_dense(lats, lons, min_samples=5, eps=200):
+    """cluster_locations with the full distance matrix, as before."""
+    dists_matrix = location.distance_matrix(lats, lons)
+    dbscan = DBSCAN(min_samples=min_samples, eps=eps, metric='precomputed')
+    return dbscan.fit_predict(dists_matrix)
+
+
+def points(n):
+    # Constant density: the area grows with n, so that each point has
+    # about the same number of neighbors.
+    rng = np.random.default_rng(0)
+    size = 0.0005 * np.sqrt(n)
+    return 60.17 + rng.uniform(0, size, n), 24.94 + rng.uniform(0, 2 * size, n)
+
+
+def bench(name, function, n):
+    lats, lons = points(n)
+    tracemalloc.start()
+    start = time.perf_counter()
+    function(lats, lons)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('  {:8} n={:6}  {:10.1f} MB  {:7.3f} s'.format(name, n, peak / 1e6, seconds))
+
+
+def main():
+    for n in (1000, 2000, 4000, 8000, 16000, 32000, 64000):
+        bench('sparse', location.cluster_locations, n)
+        if n <= 4000:
+            bench('dense', cluster_locations_dense, n)
+
+
+if __name__ == '__main__':
+    main()
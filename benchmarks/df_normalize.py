@@ -0,0 +1,53 @@
+"""Benchmark util.df_normalize.
+
+Measures rows per second of normalizing 'time' tables (raw sensor data)
+and 'day'/'hour' tables (such as the output of Data1.hourly()), compared
+to the previous row-by-row implementation of the day/hour case.  Run
+with::
+
+    python benchmarks/df_normalize.py
+"""
+
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from niimpy.preprocessing import util
+
+# The day/hour tables span years of hours; avoid ambiguous DST hours.
+TZ = 'UTC'
+
+
+def df_normalize_rowwise(df, tz):
+    """The day/hour branch of df_normalize before vectorization."""
+    index = df[['day', 'hour']].apply(lambda row: pd.Timestamp('%s %s:00'%(row['day'], row['hour'])), axis=1)
+    df.index = index.dt.tz_localize(tz)
+    df.index.name = None
+
+
+def time_table(n):
+    return pd.DataFrame({'time': 1500000000 + np.arange(n) * 1.5, 'x': np.arange(n)})
+
+
+def day_hour_table(n):
+    times = pd.to_datetime(1500000000 + np.arange(n) * 3600, unit='s')
+    return pd.DataFrame({'day': times.strftime('%Y-%m-%d'), 'hour': times.hour, 'x': np.arange(n)})
+
+
+def bench(name, make, function, n):
+    df = make(n)
+    seconds = min(timeit.repeat(lambda: function(df.copy(), tz=TZ), number=1, repeat=3))
+    print('  {:24} {:12,.0f} rows/s'.format(name, n / seconds))
+
+
+def main():
+    for n in (10000, 100000):
+        print('{} rows'.format(n))
+        bench('time', time_table, util.df_normalize, n)
+        bench('day/hour', day_hour_table, util.df_normalize, n)
+        bench('day/hour (row by row)', day_hour_table, df_normalize_rowwise, n)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Benchmark memory use of location.distance_matrix.
+
+Reports the peak memory allocated besides the result (as measured by
+tracemalloc), for the blockwise computation in float64 and float32 and
+for the full-matrix computation used before.  Run with::
+
+    python benchmarks/distance_matrix.py
+"""
+
+import time
+import tracemalloc
+
+import numpy as np
+
+from niimpy.preprocessing import location
+
+
+def distance_matrix_full(lats, lons):
+    """distance_matrix with full n x n temporaries, as before."""
+    R = 6372795.477598
+    lats = np.array(lats) * np.pi / 180.0
+    lons = np.array(lons) * np.pi / 180.0
+    sins = np.sin(lats)
+    sin_matrix = sins.reshape(-1, 1) @ sins.reshape(1, -1)
+    coss = np.cos(lats)
+    cos_matrix = coss.reshape(-1, 1) @ coss.reshape(1, -1)
+    lons_matrix = lons * np.ones((len(lons), len(lons)))
+    lons_diff = np.cos(lons_matrix - lons_matrix.T)
+    dists = np.minimum(1, sin_matrix + cos_matrix * lons_diff)
+    dists = R * np.arccos(dists)
+    dists[np.isnan(dists)] = 0
+    return dists
+
+
+def bench(name, function, n):
+    rng = np.random.default_rng(0)
+    lats, lons = 60.17 + rng.uniform(0, 0.1, n), 24.94 + rng.uniform(0, 0.2, n)
+    tracemalloc.start()
+    start = time.perf_counter()
+    dists = function(lats, lons)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('  {:8} n={:6}  {:8.1f} MB extra  {:7.3f} s'.format(name, n, (peak - dists.nbytes) / 1e6, seconds))
+
+
+def main():
+    for n in (2000, 4000, 8000):
+        bench('full', distance_matrix_full, n)
+        bench('float64', location.distance_matrix, n)
+        bench('float32', lambda lats, lons: location.distance_matrix(lats, lons, dtype=np.float32), n)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Benchmark util.set_encoding and reading.util.format_column_names.
+
+Uses a wide frame like those of Google Takeout readers (hundreds of
+columns from json_normalize) and a long frame of repeated strings like
+application names, and compares set_encoding to the previous
+implementation (.str.encode().str.decode() per column).  Run with::
+
+    python benchmarks/encoding.py
+"""
+
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from niimpy.preprocessing import util
+from niimpy.reading import util as reading_util
+
+
+def set_encoding_str(df, to_encoding='utf-8', from_encoding='iso-8859-1'):
+    """set_encoding before vectorization."""
+    for column in df.columns:
+        if df[column].dtype == 'object':
+            df[column] = df[column].str.encode(from_encoding).str.decode(to_encoding)
+    return df
+
+
+def format_column_names_rename(df):
+    """format_column_names before vectorization."""
+    column_map = {}
+    for column in df.columns:
+        formatted_name = column.replace(" ", "_").lower()
+        formatted_name = re.sub(r'[^a-zA-Z0-9_()/]+', '_', formatted_name)
+        column_map[column] = formatted_name
+    df.rename(columns=column_map, inplace=True)
+
+
+def long_table(n):
+    names = np.array(['Sovellus %d ää'.encode('utf-8').decode('iso-8859-1') % i for i in range(200)], dtype=object)
+    return pd.DataFrame({'application_name': names[np.random.default_rng(0).integers(0, 200, n)]})
+
+
+def wide_table(n, ncols):
+    return pd.DataFrame({'fitValue.value.%d.Map Val.key' % i: ['x'] * n for i in range(ncols)})
+
+
+def bench(name, function, make):
+    seconds = []
+    for _ in range(3):
+        df = make()
+        start = time.perf_counter()
+        function(df)
+        seconds.append(time.perf_counter() - start)
+    seconds = min(seconds)
+    print('  {:36} {:8.3f} s'.format(name, seconds))
+
+
+def main():
+    n = 1000000
+    print('set_encoding, {} rows of 200 distinct strings'.format(n))
+    bench('str.encode/decode', set_encoding_str, lambda: long_table(n))
+    bench('set_encoding', util.set_encoding, lambda: long_table(n))
+    bench('set_encoding(dtype="string[pyarrow]")',
+          lambda df: util.set_encoding(df, dtype='string[pyarrow]'), lambda: long_table(n))
+    print('format_column_names, 1000 rows x 500 columns')
+    bench('rename', format_column_names_rename, lambda: wide_table(1000, 500))
+    bench('format_column_names', reading_util.format_column_names, lambda: wide_table(1000, 500))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Benchmark read_csv parser engines.
+
+Compares the default pandas parser with the pyarrow engine and sensor
+schemas, on the one month sample data and on a larger file made by
+repeating it.  Run with::
+
+    python benchmarks/read_csv.py
+"""
+
+import os
+import tempfile
+import timeit
+
+import pandas as pd
+
+import niimpy
+from niimpy.preprocessing import sampledata
+
+TZ = 'Europe/Helsinki'
+
+CONFIGS = {
+    'default': {},
+    'pyarrow': {'engine': 'pyarrow'},
+    'pyarrow+schema': {'engine': 'pyarrow', 'schema': True},
+}
+
+
+def bench(filename, number):
+    df = pd.read_csv(filename)
+    print('{} ({} rows)'.format(os.path.basename(filename), len(df)))
+    for name, kwargs in CONFIGS.items():
+        seconds = min(timeit.repeat(lambda: niimpy.read_csv(filename, tz=TZ, **kwargs),
+                                    number=number, repeat=3)) / number
+        df = niimpy.read_csv(filename, tz=TZ, **kwargs)
+        memory = df.memory_usage(deep=True).sum()
+        print('  {:16} {:8.1f} ms  {:8.0f} kB'.format(name, seconds*1000, memory/1024))
+
+
+def main(scale=100):
+    for filename in (sampledata.SCREEN_MONTH, sampledata.BATTERY_MONTH):
+        bench(filename, number=20)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for filename in (sampledata.SCREEN_MONTH, sampledata.BATTERY_MONTH):
+            large = os.path.join(tmpdir, os.path.basename(filename).replace('1month', 'x%d'%scale))
+            pd.concat([pd.read_csv(filename)]*scale).to_csv(large, index=False)
+            bench(large, number=1)
+
+
+if __name__ == '__main__':
+    main()
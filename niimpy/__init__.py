@@ -1,12 +1,37 @@
 from ._version import __version__
 
+import importlib
+
 from niimpy.reading.database import open, Data1, ALL
 from niimpy.preprocessing.filter import filter_dataframe
 from niimpy.reading.sqlite import read_sqlite, read_sqlite_tables
 from niimpy.reading.csv import read_csv, read_csv_string
+from niimpy.reading.cache import cache_clear
+from niimpy.reading.many import read_many
 from niimpy.preprocessing import sampledata
 from niimpy.preprocessing import util
 
-# Analysis functions
-from niimpy.preprocessing.screen import screen_off, screen_duration
-from niimpy.preprocessing.battery import (battery_occurrences, format_battery_data)
+# Subpackages, and functions of modules with heavy dependencies, are
+# imported on first use (PEP 562), so that `import niimpy` stays fast.
+_SUBMODULES = {'analysis', 'config', 'exploration', 'preprocessing', 'reading', 'store'}
+_LAZY = {
+    # Analysis functions
+    'screen_off': 'niimpy.preprocessing.screen',
+    'screen_duration': 'niimpy.preprocessing.screen',
+    'battery_occurrences': 'niimpy.preprocessing.battery',
+    'format_battery_data': 'niimpy.preprocessing.battery',
+}
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module('niimpy.' + name)
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module 'niimpy' has no attribute {!r}".format(name))
+
+
+def __dir__():
+    return sorted(set(globals()) | _SUBMODULES | set(_LAZY))
@@ -84,7 +84,7 @@ def _aggregate(data: pd.DataFrame, groupby_cols: list, freq: str) -> pd.DataFram
     
     agg_data = []
 
-    for name, user_data in data.groupby(groupby_cols):
+    for name, user_data in data.groupby(groupby_cols, observed=True):
         if freq == 'daily':
 
             agg_features = user_data.groupby(user_data.index.hour).sum(numeric_only=True)
@@ -132,7 +132,7 @@ def _compute_distribution(data: pd.DataFrame,  cols: list, groupby_cols: list, f
         if col not in data.columns:
             raise ValueError(f"The specified column '{col}' does not exist in the input dataframe.")
         
-        values_sum = data.groupby(by=groupby_cols)[col].transform('sum')
+        values_sum = data.groupby(by=groupby_cols, observed=True)[col].transform('sum')
         data[f'{col}_distr'] = data[col] / values_sum
     return data
 
@@ -189,7 +189,7 @@ def compute_rhythms(df: pd.DataFrame,
 
     aligned_df = _align_data(df, period=period, freq=freq)
 
-    resampled_df = aligned_df.groupby(groupby_cols).resample(timebin, include_groups=False).sum().reset_index(level=0) # keep time index
+    resampled_df = aligned_df.groupby(groupby_cols, observed=True).resample(timebin, include_groups=False).sum().reset_index(level=0) # keep time index
     
     agg_data = _aggregate(resampled_df, groupby_cols=groupby_cols, freq=freq)
     
@@ -250,7 +250,7 @@ def rhythm(
         if df[col].dtype == 'object':
             df[col] = 1
 
-    df = df.groupby(groupby_cols).resample(bin, include_groups=False).sum()
+    df = df.groupby(groupby_cols, observed=True).resample(bin, include_groups=False).sum()
     df.reset_index(groupby_cols, inplace=True)
     
     freq_in_bins = pd.to_timedelta(freq) // pd.to_timedelta(bin)
@@ -262,14 +262,14 @@ def rhythm(
         df = df.set_index("index")
         return df
 
-    df = df.groupby(groupby_cols).apply(_get_bin_index, include_groups=False)
+    df = df.groupby(groupby_cols, observed=True).apply(_get_bin_index, include_groups=False)
     df.reset_index(groupby_cols, inplace=True)
     
-    df = df.groupby(groupby_cols+["bin"]).sum()
+    df = df.groupby(groupby_cols+["bin"], observed=True).sum()
     df.reset_index(groupby_cols, inplace=True)
 
     df["freq"] = df.index // freq_in_bins
-    freq_sum = df.groupby(groupby_cols+["freq"], as_index=False).sum()
+    freq_sum = df.groupby(groupby_cols+["freq"], as_index=False, observed=True).sum()
     df = pd.merge(df, freq_sum, on=groupby_cols+["freq"], how="left", suffixes=('', '_sum'))
     for col in cols:
         df[col+"_rhythm"] = df[col] / df[col+"_sum"]
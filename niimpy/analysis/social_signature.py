@@ -37,7 +37,7 @@ def social_signature(df: pd.DataFrame, to_column = "to", from_column = "from", u
         df = df.explode(to_column)
     
     sent_by_user = df[df[from_column] == 0]
-    interaction_counts = sent_by_user.groupby(to_column).size()
+    interaction_counts = sent_by_user.groupby(to_column, observed=True).size()
         
     total_interactions = interaction_counts.sum()
     social_signature = interaction_counts / total_interactions
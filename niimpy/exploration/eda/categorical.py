@@ -189,7 +189,7 @@ def question_by_group(df, question, group='group'):
     assert isinstance(group, (type(None), str)), "group is not a boolean or string."
     
     grouped = df[[question, group]].reset_index(drop=True)
-    grouped = grouped.groupby([group,question]).agg({question:'count'})
+    grouped = grouped.groupby([group,question], observed=True).agg({question:'count'})
     grouped = grouped.rename(columns={question:'count'}).reset_index()
     grouped = grouped.rename(columns={question:'answer'})
     return grouped
@@ -1,2 +1,16 @@
+import importlib
 
-from . import location
+# Submodules are imported on first use (PEP 562): some of them, such as
+# location, have heavy dependencies.
+_SUBMODULES = {'application', 'audio', 'battery', 'communication', 'filter', 'location',
+               'sampledata', 'screen', 'survey', 'tracker', 'util'}
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(__name__ + '.' + name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | _SUBMODULES)
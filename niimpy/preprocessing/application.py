@@ -344,8 +344,9 @@ def app_count(df, bat=None, screen=None, group_map = MAP_APP, resample_args = {"
     """
 
     assert isinstance(df, pd.DataFrame), "Please input data as a pandas DataFrame type"
-    bat = util.ensure_dataframe(bat)
-    screen = util.ensure_dataframe(screen)
+    df = util.expand_time(df)
+    bat = util.expand_time(util.ensure_dataframe(bat))
+    screen = util.expand_time(util.ensure_dataframe(screen))
     
     df2 = classify_app(df, group_map = group_map, **kwargs)
 
@@ -421,8 +422,9 @@ def app_duration(df, bat=None, screen=None, group_map = MAP_APP, resample_args =
     """
 
     assert isinstance(df, pd.DataFrame), "Please input data as a pandas DataFrame type"
-    bat = util.ensure_dataframe(bat)
-    screen = util.ensure_dataframe(screen)
+    df = util.expand_time(df)
+    bat = util.expand_time(util.ensure_dataframe(bat))
+    screen = util.expand_time(util.ensure_dataframe(screen))
     niimpy_cols = list(set(["group", "user", "device"]) & set(df.columns))
 
     df2 = classify_app(df, group_map = group_map, **kwargs)
@@ -522,8 +524,9 @@ def extract_features_app(df, bat=None, screen=None, features=None):
         Resulting dataframe
     """
     assert isinstance(df, pd.DataFrame), "Please input data as a pandas DataFrame type"
-    bat = util.ensure_dataframe(bat)
-    screen = util.ensure_dataframe(screen)
+    df = util.expand_time(df)
+    bat = util.expand_time(util.ensure_dataframe(bat))
+    screen = util.expand_time(util.ensure_dataframe(screen))
 
     if features is None:
         features = ALL_FEATURES
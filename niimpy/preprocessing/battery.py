@@ -201,6 +201,7 @@ def battery_occurrences(df, battery_status=False, battery_status_column_name="ba
         information. Keys can be column names, other dictionaries, etc. 
     """
     assert isinstance(df, pd.DataFrame), "data is not a pandas DataFrame"
+    df = util.expand_time(df)
 
     occurrence_data = df.drop_duplicates(subset=['datetime', 'device', battery_status_column_name], keep='last')
 
@@ -1,9 +1,12 @@
 import collections
+import inspect
 
 import pandas as pd
 import numpy as np
+import scipy.sparse
 import scipy.stats
 from sklearn.cluster import DBSCAN
+from sklearn.neighbors import BallTree
 from geopy.distance import geodesic
 from tzfpy import get_tz
 
@@ -12,11 +15,16 @@ from niimpy.preprocessing import util
 default_freq = "1ME"
 
 
-def distance_matrix(lats, lons):
+def distance_matrix(lats, lons, dtype=np.float64, out=None, block_size=None):
     """Compute distance matrix using great-circle distance formula
 
     https://en.wikipedia.org/wiki/Great-circle_distance#Formulae
 
+    The matrix is computed in blocks of rows, so that memory use besides
+    the result is bounded by the block size.  Large matrices can be
+    written directly to a memory-mapped file with `out`, e.g.
+    ``out=np.lib.format.open_memmap(path, 'w+', np.float32, (n, n))``.
+
     Parameters
     ----------
     lats : array
@@ -25,15 +33,26 @@ def distance_matrix(lats, lons):
     lons : array
         Longitudes
 
+    dtype : numpy dtype
+        Data type of the result.  Distances are computed in float64
+        and then converted, so float32 halves the memory of the result.
+        Ignored if `out` is given.
+
+    out : array, optional
+        Array of shape `(n, n)` to write the distances to, such as a
+        numpy.memmap.
+
+    block_size : int, optional
+        Number of rows computed at once.  By default, blocks of about
+        a million entries.
+
     Returns
     -------
     dists : matrix
         Entry `(i, j)` shows the great-circle distance between
         point `i` and `j`, i.e. distance between `(lats[i], lons[i])`
-        and `(lats[j], lons[j])`.
+        and `(lats[j], lons[j])`.  This is `out` if it was given.
     """
-    R = 6372795.477598
-
     lats = np.array(lats)
     lons = np.array(lons)
 
@@ -41,27 +60,225 @@ def distance_matrix(lats, lons):
     assert not any(np.isnan(lats)), "nan in lats"
     assert not any(np.isnan(lons)), "nan in lons"
 
+    n = len(lats)
+    if out is None:
+        out = np.empty((n, n), dtype=dtype)
+    elif out.shape != (n, n):
+        raise ValueError("out has shape {}, expected {}".format(out.shape, (n, n)))
+    if block_size is None:
+        block_size = max(1, 2**20 // max(n, 1))
+
     # convert degree to radian
     lats = lats * np.pi / 180.0
     lons = lons * np.pi / 180.0
 
-    sins = np.sin(lats)
-    sin_matrix = sins.reshape(-1, 1) @ sins.reshape(1, -1)
-
-    coss = np.cos(lats)
-    cos_matrix = coss.reshape(-1, 1) @ coss.reshape(1, -1)
+    for i in range(0, n, block_size):
+        rows = slice(i, i + block_size)
+        out[rows] = _great_circle(lats[rows, None], lons[rows, None], lats, lons)
+    return out
 
-    lons_matrix = lons * np.ones((len(lons), len(lons)))
-    lons_diff = lons_matrix - lons_matrix.T
-    lons_diff = np.cos(lons_diff)
 
-    # TODO: make this function more efficient
-    dists = np.minimum(1, sin_matrix + cos_matrix * lons_diff)
+def _great_circle(lats1, lons1, lats2, lons2):
+    """Great-circle distances of `distance_matrix`, between pairs of points in radians."""
+    R = 6372795.477598
+    dists = np.minimum(1, np.sin(lats1) * np.sin(lats2)
+                          + np.cos(lats1) * np.cos(lats2) * np.cos(lons2 - lons1))
     dists = R * np.arccos(dists)
     dists[np.isnan(dists)] = 0
     return dists
 
 
+def radius_neighbors_graph(lats, lons, eps):
+    """Compute the distances of all pairs of points closer than `eps`.
+
+    This is the sparse version of `distance_matrix`: only distances of
+    at most `eps` meters are stored, so memory use grows with the number
+    of neighbors instead of the square of the number of points.  The
+    distances are the same as those of `distance_matrix`.
+
+    Parameters
+    ----------
+    lats : array
+        Latitudes
+    lons : array
+        Longitudes
+    eps : float
+        Maximum distance, in meters.
+
+    Returns
+    -------
+    graph : scipy.sparse.csr_matrix
+        Entry `(i, j)` is the great-circle distance between point `i`
+        and `j`, if it is at most `eps`.  Zero distances are stored
+        explicitly.
+    """
+    R = 6372795.477598
+
+    lats = np.asarray(lats, dtype=float) * np.pi / 180.0
+    lons = np.asarray(lons, dtype=float) * np.pi / 180.0
+    n = len(lats)
+
+    # Find candidates with a BallTree, with some margin for the
+    # different rounding of the haversine metric, and then compute the
+    # exact distances of the candidates.
+    tree = BallTree(np.column_stack([lats, lons]), metric='haversine')
+    neighbors = tree.query_radius(np.column_stack([lats, lons]), r=(eps * (1 + 1e-6) + 1) / R)
+    rows = np.repeat(np.arange(n), [len(x) for x in neighbors])
+    cols = np.concatenate(neighbors) if n > 0 else np.array([], dtype=int)
+    dists = _great_circle(lats[rows], lons[rows], lats[cols], lons[cols])
+    close = dists <= eps
+    return _sorted_graph(rows[close], cols[close], dists[close], n)
+
+
+def _sorted_graph(rows, cols, dists, n):
+    """Build an n x n csr_matrix of distances, with each row sorted by distance.
+
+    sklearn expects this of precomputed neighbor graphs, and otherwise
+    sorts them row by row.  The matrix is built from its arrays, since
+    conversion from coordinates would sort the rows by column.
+    """
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n))])
+    if len(dists) > 32 * n:
+        # Long rows, which are faster to sort one at a time.
+        order = np.argsort(rows, kind='stable')
+        for start, end in zip(indptr[:-1], indptr[1:]):
+            order[start:end] = order[start:end][np.argsort(dists[order[start:end]], kind='stable')]
+    else:
+        order = np.lexsort((dists, rows))
+    return scipy.sparse.csr_matrix((dists[order], cols[order], indptr), shape=(n, n))
+
+
+def _subgraph(graph, idx):
+    """Neighbor graph of the points `idx` of a graph from `radius_neighbors_graph`."""
+    graph = graph[idx][:, idx].tocoo()
+    return _sorted_graph(graph.row, graph.col, graph.data, len(idx))
+
+
+# WGS-84 ellipsoid, as used by geopy.distance.geodesic
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+# Mean earth radius, for haversine distances
+EARTH_RADIUS = 6371008.8
+
+
+def haversine_distances(lats1, lons1, lats2, lons2):
+    """Compute great-circle distances between pairs of points on a sphere.
+
+    Fast, but differs from geodesic distances by up to about 0.5%.
+
+    Parameters
+    ----------
+    lats1, lons1, lats2, lons2 : array-like
+        Coordinates of the points, in degrees.  Arrays are broadcast
+        together.
+
+    Returns
+    -------
+    dists : array
+        Distances in meters.
+    """
+    lats1, lons1, lats2, lons2 = (np.radians(np.asarray(x, dtype=float)) for x in (lats1, lons1, lats2, lons2))
+    a = (np.sin((lats2 - lats1) / 2) ** 2
+         + np.cos(lats1) * np.cos(lats2) * np.sin((lons2 - lons1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+def geodesic_distances(lats1, lons1, lats2, lons2, tol=1e-12, max_iter=200):
+    """Compute geodesic distances between pairs of points on the WGS-84 ellipsoid.
+
+    This is Vincenty's inverse formula, computed for all pairs at once.
+    The results agree with geopy.distance.geodesic to well below a
+    millimeter.  For nearly antipodal points, for which the formula does
+    not converge, geopy is used instead.
+
+    Parameters
+    ----------
+    lats1, lons1, lats2, lons2 : array-like
+        Coordinates of the points, in degrees.  Arrays are broadcast
+        together.
+
+    Returns
+    -------
+    dists : array
+        Distances in meters.
+    """
+    lats1, lons1, lats2, lons2 = np.broadcast_arrays(*(np.asarray(x, dtype=float)
+                                                       for x in (lats1, lons1, lats2, lons2)))
+    shape = lats1.shape
+    lats1, lons1, lats2, lons2 = (x.ravel() for x in (lats1, lons1, lats2, lons2))
+    a, f = WGS84_A, WGS84_F
+    b = (1 - f) * a
+    L = np.radians(lons2 - lons1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lats1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lats2)))
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+    lam = L
+    # Pairs with missing coordinates never converge, do not wait for them.
+    finite = np.isfinite(L) & np.isfinite(U1) & np.isfinite(U2)
+    converged = ~finite
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(max_iter):
+            sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+            sin_sigma = np.hypot(cosU2 * sin_lam, cosU1 * sinU2 - sinU1 * cosU2 * cos_lam)
+            cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0, cosU1 * cosU2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # cos2_alpha is 0 for points on the equator
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0, cos_sigma - 2 * sinU1 * sinU2 / cos2_alpha)
+            C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            lam_prev = lam
+            lam = L + (1 - C) * f * sin_alpha * (
+                sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+            converged = (np.abs(lam - lam_prev) < tol) | ~finite
+            if converged.all():
+                break
+
+        u2 = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+        A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+        B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+        delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+            - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+        dists = b * A * (sigma - delta_sigma)
+
+    for i in np.flatnonzero(~converged | np.isnan(dists)):
+        if np.isnan([lats1[i], lons1[i], lats2[i], lons2[i]]).any():
+            continue
+        dists[i] = geodesic((lats1[i], lons1[i]), (lats2[i], lons2[i])).meters
+    return dists.reshape(shape)
+
+
+DISTANCE_METHODS = {
+    'geodesic': geodesic_distances,
+    'haversine': haversine_distances,
+}
+
+
+def point_distances(lats1, lons1, lats2, lons2, distance_method='geodesic'):
+    """Compute distances between pairs of points.
+
+    Parameters
+    ----------
+    lats1, lons1, lats2, lons2 : array-like
+        Coordinates of the points, in degrees.
+
+    distance_method : str
+        "geodesic" (exact, on the WGS-84 ellipsoid, the default) or
+        "haversine" (faster, on a sphere).
+
+    Returns
+    -------
+    dists : array
+        Distances in meters.
+    """
+    if distance_method not in DISTANCE_METHODS:
+        raise ValueError("distance_method must be one of {}, not {!r}".format(sorted(DISTANCE_METHODS), distance_method))
+    return DISTANCE_METHODS[distance_method](lats1, lons1, lats2, lons2)
+
+
 def filter_location(location,
                     remove_disabled=True,
                     remove_zeros=True,
@@ -109,7 +326,7 @@ def filter_location(location,
     return location
 
 
-def get_speeds_totaldist(lats, lons, times):
+def get_speeds_totaldist(lats, lons, times, distance_method='geodesic'):
     """Computes speed of bins with dividing distance by their time difference
 
     Parameters
@@ -120,6 +337,9 @@ def get_speeds_totaldist(lats, lons, times):
         Array of longitudes
     times : array-like
         Array of times associted with bins
+    distance_method : str
+        How distances are computed, "geodesic" (default) or "haversine",
+        see `point_distances`.
 
     Returns
     ------
@@ -131,17 +351,18 @@ def get_speeds_totaldist(lats, lons, times):
     if n_bins == 0:
         return ([], [])
 
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    times = pd.DatetimeIndex(times)
+
     dists = np.zeros(n_bins)
     time_deltas = np.ones(n_bins)
-    for i in range(1, n_bins):
-        loc1 = (lats.iloc[i - 1], lons.iloc[i - 1])
-        loc2 = (lats.iloc[i], lons.iloc[i])
-
-        time_deltas[i] = (times[i] - times[i - 1]).total_seconds()
-        dists[i] = geodesic(loc1, loc2).meters
-    speeds = dists / time_deltas
+    time_deltas[1:] = (times[1:] - times[:-1]).total_seconds()
+    dists[1:] = point_distances(lats[:-1], lons[:-1], lats[1:], lons[1:], distance_method=distance_method)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speeds = dists / time_deltas
     speeds[0] = 0
-    return speeds, sum(dists)
+    return speeds, dists.sum()
 
 
 def find_home(lats, lons, times):
@@ -166,13 +387,18 @@ def find_home(lats, lons, times):
     (lat_home, lon_home) : tuple of floats
         Coordinates of the home
     """
-    idx_night = [True if t.hour <= 6 else False for t in times]
-    if sum(idx_night) == 0:
+    idx_night = np.asarray(pd.DatetimeIndex(times).hour <= 6)
+    if not idx_night.any():
         return np.nan, np.nan
 
     lats_night = lats[idx_night]
     lons_night = lons[idx_night]
     clusters = cluster_locations(lats_night, lons_night)
+    return _home_location(lats_night, lons_night, clusters)
+
+
+def _home_location(lats_night, lons_night, clusters):
+    """Mean location of the largest cluster of night-time locations."""
     counter = collections.Counter(clusters)
     home_cluster = counter.most_common()[0][0]
 
@@ -207,9 +433,21 @@ def cluster_locations(lats, lons, min_samples=5, eps=200):
     """
     if lats.shape[0] == 0 or lons.shape[0] == 0:
         return np.array([])
-    dists_matrix = distance_matrix(lats, lons)
+    lats = np.asarray(lats)
+    lons = np.asarray(lons)
+    assert len(lats) == len(lons), "lats and lons should be of the same size"
+    assert not any(np.isnan(lats)), "nan in lats"
+    assert not any(np.isnan(lons)), "nan in lons"
+    # A sparse graph of the neighbors within eps gives the same clusters
+    # as the full distance matrix, without its quadratic memory use.
+    dists_graph = radius_neighbors_graph(lats, lons, eps)
+    return _cluster_graph(dists_graph, min_samples, eps)
+
+
+def _cluster_graph(dists_graph, min_samples=5, eps=200):
+    """DBSCAN clusters of a neighbor graph from `radius_neighbors_graph`."""
     dbscan = DBSCAN(min_samples=min_samples, eps=eps, metric='precomputed')
-    clusters = dbscan.fit_predict(dists_matrix)
+    clusters = dbscan.fit_predict(dists_graph)
     return clusters
 
 
@@ -262,44 +500,7 @@ def number_of_significant_places(lats, lons, times):
     return np.nanmedian(sps)
 
 
-def number_of_significant_places(
-        df,
-        latitude_column="latitude",
-        longitude_column="longitude",
-        resample_args={"rule": default_freq},
-        **kwargs
-    ):
-    """ Computes number of significant places.
-
-    This feature is included in location_significant_place_features as
-    n_sps and this standalone function is not included in default location
-    features.
-    """
-    assert isinstance(df, pd.DataFrame), "df_u is not a pandas dataframe"
-
-    def compute_features(df):
-        df = df.sort_index()  # sort based on time
-
-        lats = df[latitude_column]
-        lons = df[longitude_column]
-
-        clusters = cluster_locations(lats, lons)
-        number_of_sps = len(set(clusters))
-        if -1 in clusters:
-            number_of_sps -= 1
-        
-        row = pd.Series({
-            'n_significant_places': number_of_sps,
-        })
-        return row
-    
-    result = util.group_data(df).resample(**resample_args, include_groups=False).apply(compute_features)
-    result = util.reset_groups(result)
-    result = util.select_columns(result, ["n_significant_places"])
-    return result
-
-
-def compute_nbin_maxdist_home(lats, lons, latlon_home, home_radius=50):
+def compute_nbin_maxdist_home(lats, lons, latlon_home, home_radius=50, distance_method='geodesic'):
     """Computes number of bins in home and maximum distance to home
 
     Parameters
@@ -310,6 +511,10 @@ def compute_nbin_maxdist_home(lats, lons, latlon_home, home_radius=50):
         Longitudes
     latlon_home : array
         A tuple (lat, lon) showing the coordinate of home
+    home_radius : float
+        Bins closer than this to home, in meters, are at home.
+    distance_method : str
+        "geodesic" (default) or "haversine", see `point_distances`.
 
     Returns
     -------
@@ -321,16 +526,219 @@ def compute_nbin_maxdist_home(lats, lons, latlon_home, home_radius=50):
         time_home = np.nan
         max_dist_home = np.nan
     else:
-        home_idx = []
-        max_dist_home = 0
-        for latlon in zip(lats, lons):
-            dist_home = geodesic(latlon, latlon_home).meters
-            home_idx.append(dist_home <= home_radius)
-            max_dist_home = max(max_dist_home, dist_home)
-        time_home = sum(home_idx)
+        dists_home = point_distances(lats, lons, latlon_home[0], latlon_home[1],
+                                     distance_method=distance_method)
+        time_home = int(np.count_nonzero(dists_home <= home_radius))
+        max_dist_home = np.nanmax(dists_home, initial=0)
     return time_home, max_dist_home
 
 
+class _LocationWindow(object):
+    """Location data of one user and time window.
+
+    The computations which location features have in common (sorting,
+    speeds, the neighbor graph, clusters and home) are done once, when
+    first needed, and shared by all features of the window.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Data of the window, indexed by time.
+    """
+    def __init__(self, df):
+        self.df = df.sort_index()  # sort based on time
+        self.times = self.df.index
+        self._cache = {}
+
+    def __len__(self):
+        return self.df.shape[0]
+
+    def speeds_totaldist(self, latitude_column, longitude_column, distance_method):
+        """Return `get_speeds_totaldist` of the window."""
+        key = ('speeds', latitude_column, longitude_column, distance_method)
+        if key not in self._cache:
+            self._cache[key] = get_speeds_totaldist(self.df[latitude_column], self.df[longitude_column],
+                                                    self.times, distance_method=distance_method)
+        return self._cache[key]
+
+    def clusters(self, latitude_column, longitude_column, mask=None):
+        """Return `cluster_locations` of the window, or of the rows selected by `mask`.
+
+        The neighbor graph of all rows is computed once, and the graph
+        of a subset of rows is a submatrix of it.  This gives the same
+        clusters as `cluster_locations` of the subset.
+        """
+        mask_key = None if mask is None else np.asarray(mask, dtype=bool).tobytes()
+        key = ('clusters', latitude_column, longitude_column, mask_key)
+        if key in self._cache:
+            return self._cache[key]
+
+        lats = self.df[latitude_column]
+        lons = self.df[longitude_column]
+        if mask is not None:
+            mask = np.asarray(mask, dtype=bool)
+            lats, lons = lats[mask], lons[mask]
+        if len(lats) == 0 or self.df[[latitude_column, longitude_column]].isna().any(axis=None):
+            clusters = cluster_locations(lats, lons)
+        else:
+            graph_key = ('graph', latitude_column, longitude_column)
+            if graph_key not in self._cache:
+                self._cache[graph_key] = radius_neighbors_graph(self.df[latitude_column], self.df[longitude_column], 200)
+            graph = self._cache[graph_key]
+            if mask is not None:
+                graph = _subgraph(graph, np.flatnonzero(mask))
+            clusters = _cluster_graph(graph)
+        self._cache[key] = clusters
+        return clusters
+
+    def home(self, latitude_column, longitude_column):
+        """Return `find_home` of the window."""
+        key = ('home', latitude_column, longitude_column)
+        if key not in self._cache:
+            idx_night = np.asarray(self.times.hour <= 6)
+            if not idx_night.any():
+                self._cache[key] = np.nan, np.nan
+            else:
+                clusters = self.clusters(latitude_column, longitude_column, idx_night)
+                self._cache[key] = _home_location(self.df[latitude_column][idx_night],
+                                                  self.df[longitude_column][idx_night], clusters)
+        return self._cache[key]
+
+
+def _window_features(df, features, resample_args):
+    """Compute location features of each user and time window in one pass.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Location data.
+    features : list of (function, dict) tuples
+        Feature functions in `_WINDOW_FEATURES`, and the arguments of
+        their window functions.
+    resample_args : dict
+        Arguments of the resample function.
+    """
+    def compute_features(df):
+        window = _LocationWindow(df)
+        rows = [_WINDOW_FEATURES[function][0](window, **arguments) for function, arguments in features]
+        if all(row is None for row in rows):
+            return None
+        # Features without values in this window are missing, like when
+        # concatenating features computed separately.  Keep the data
+        # type of each row, as if computed separately.
+        rows = [pd.Series(np.nan, index=_WINDOW_FEATURES[function][1]) if row is None else row
+                for (function, _), row in zip(features, rows)]
+        return pd.concat([row.astype(object) for row in rows])
+
+    result = util.group_data(df).resample(**resample_args, include_groups=False).apply(compute_features)
+    result = util.reset_groups(result)
+    result = result.infer_objects()
+    result = util.select_columns(result, [column for function, _ in features for column in _WINDOW_FEATURES[function][1]])
+    return result
+
+
+def _n_significant_places_window(window, latitude_column, longitude_column):
+    """Compute the features of `number_of_significant_places` of a window."""
+    clusters = window.clusters(latitude_column, longitude_column)
+    number_of_sps = len(set(clusters))
+    if -1 in clusters:
+        number_of_sps -= 1
+
+    row = pd.Series({
+        'n_significant_places': number_of_sps,
+    })
+    return row
+
+
+def number_of_significant_places(
+        df,
+        latitude_column="latitude",
+        longitude_column="longitude",
+        resample_args={"rule": default_freq},
+        **kwargs
+    ):
+    """ Computes number of significant places.
+
+    This feature is included in location_significant_place_features as
+    n_sps and this standalone function is not included in default location
+    features.
+    """
+    assert isinstance(df, pd.DataFrame), "df_u is not a pandas dataframe"
+
+    arguments = dict(latitude_column=latitude_column, longitude_column=longitude_column)
+    return _window_features(df, [(number_of_significant_places, arguments)], resample_args)
+
+
+def _significant_place_window(window, latitude_column, longitude_column, speed_column,
+                              speed_threshold, distance_method):
+    """Compute the features of `location_significant_place_features` of a window."""
+    if len(window) == 0:
+        return None
+
+    df = window.df
+    lats = df[latitude_column]
+    lons = df[longitude_column]
+
+    # Home realted featuers
+    latlon_home = window.home(latitude_column, longitude_column)
+
+    if speed_column in df:
+        speeds = df[speed_column]
+    else:
+        speeds, _ = window.speeds_totaldist(latitude_column, longitude_column, distance_method)
+
+    static_bins = speeds < speed_threshold
+    lats_static = lats[static_bins]
+    lons_static = lons[static_bins]
+    clusters = window.clusters(latitude_column, longitude_column, static_bins)
+
+    non_rare_clusters = clusters[clusters != -1]
+    n_unique_sps = len(set(non_rare_clusters))
+    if n_unique_sps > 1:
+        entropy = scipy.stats.entropy(non_rare_clusters)
+        normalized_entropy = entropy / np.log(len(set(non_rare_clusters)))
+    else:
+        entropy = 0
+        normalized_entropy = 0
+
+    counter = collections.Counter(clusters)
+    stay_times = counter.values()
+    stay_times = np.sort(list(stay_times))[::-1]
+
+    n_static = sum(static_bins)
+    n_moving = sum(~static_bins)
+    n_rare = counter[-1]
+    n_home, max_dist_home = compute_nbin_maxdist_home(
+        lats_static, lons_static, latlon_home, distance_method=distance_method
+    )
+
+    n_transitions = sum(np.diff(clusters) != 0)
+
+    n_top1 = stay_times[0] if len(stay_times) > 0 else 0
+    n_top2 = stay_times[1] if len(stay_times) > 1 else 0
+    n_top3 = stay_times[2] if len(stay_times) > 2 else 0
+    n_top4 = stay_times[3] if len(stay_times) > 3 else 0
+    n_top5 = stay_times[4] if len(stay_times) > 4 else 0
+
+    row = pd.Series({
+        'n_sps': n_unique_sps,
+        'n_static': n_static,
+        'n_moving': n_moving,
+        'n_rare': n_rare,
+        'n_home': n_home,
+        'max_dist_home': max_dist_home,
+        'n_transitions': n_transitions,
+        'n_top1': n_top1,
+        'n_top2': n_top2,
+        'n_top3': n_top3,
+        'n_top4': n_top4,
+        'n_top5': n_top5,
+        'entropy': entropy,
+        'normalized_entropy': normalized_entropy,
+    })
+    return row
+
+
 def location_significant_place_features(
         df,
         latitude_column="latitude",
@@ -338,6 +746,7 @@ def location_significant_place_features(
         speed_column="speed",
         speed_threshold=0.277,
         resample_args={"rule": default_freq},
+        distance_method="geodesic",
         **kwargs
     ):
     """Calculates features related to Significant Places.
@@ -352,83 +761,51 @@ def location_significant_place_features(
         latitude_column: The name of the column with latitude data in a floating point format. Defaults to 'latitude'.
         speed_column: The name of the column with speed data in a floating point format. Defaults to 'speed'.
         resample_args: a dictionary of arguments for the Pandas resample function. For example to resample by hour, you would pass {"rule": "1h"}.
+        distance_method: How distances between points are computed, "geodesic" (default) or the faster but less exact "haversine".
     """
     assert isinstance(df, pd.DataFrame), "df_u is not a pandas dataframe"
 
-    def compute_features(df):
-        """Compute features for a single user"""
-        df = df.sort_index()  # sort based on time
+    arguments = dict(latitude_column=latitude_column, longitude_column=longitude_column,
+                     speed_column=speed_column, speed_threshold=speed_threshold,
+                     distance_method=distance_method)
+    return _window_features(df, [(location_significant_place_features, arguments)], resample_args)
 
-        if df.shape[0] == 0:
-            return None
 
-        lats = df[latitude_column]
-        lons = df[longitude_column]
-        times = df.index
+def _distance_window(window, latitude_column, longitude_column, speed_column, distance_method):
+    """Compute the features of `location_distance_features` of a window."""
+    n_bins = len(window)
 
-        # Home realted featuers
-        latlon_home = find_home(lats, lons, times)
+    if n_bins == 0:
+        return None
 
-        if speed_column in df:
-            speeds = df[speed_column]
-        else:
-            speeds, _ = get_speeds_totaldist(lats, lons, times)
-
-        static_bins = speeds < speed_threshold
-        lats_static = lats[static_bins]
-        lons_static = lons[static_bins]
-        clusters = cluster_locations(lats_static, lons_static)
-
-        non_rare_clusters = clusters[clusters != -1]
-        n_unique_sps = len(set(non_rare_clusters))
-        if n_unique_sps > 1:
-            entropy = scipy.stats.entropy(non_rare_clusters)
-            normalized_entropy = entropy / np.log(len(set(non_rare_clusters)))
-        else:
-            entropy = 0
-            normalized_entropy = 0
-
-        counter = collections.Counter(clusters)
-        stay_times = counter.values()
-        stay_times = np.sort(list(stay_times))[::-1]
-
-        n_static = sum(static_bins)
-        n_moving = sum(~static_bins)
-        n_rare = counter[-1]
-        n_home, max_dist_home = compute_nbin_maxdist_home(
-            lats_static, lons_static, latlon_home
-        )
-
-        n_transitions = sum(np.diff(clusters) != 0)
-
-        n_top1 = stay_times[0] if len(stay_times) > 0 else 0
-        n_top2 = stay_times[1] if len(stay_times) > 1 else 0
-        n_top3 = stay_times[2] if len(stay_times) > 2 else 0
-        n_top4 = stay_times[3] if len(stay_times) > 3 else 0
-        n_top5 = stay_times[4] if len(stay_times) > 4 else 0
-
-        row = pd.Series({
-            'n_sps': n_unique_sps,
-            'n_static': n_static,
-            'n_moving': n_moving,
-            'n_rare': n_rare,
-            'n_home': n_home,
-            'max_dist_home': max_dist_home,
-            'n_transitions': n_transitions,
-            'n_top1': n_top1,
-            'n_top2': n_top2,
-            'n_top3': n_top3,
-            'n_top4': n_top4,
-            'n_top5': n_top5,
-            'entropy': entropy,
-            'normalized_entropy': normalized_entropy,
-        })
-        return row
+    df = window.df
+    lats = df[latitude_column]
+    lons = df[longitude_column]
 
-    result = util.group_data(df).resample(**resample_args, include_groups=False).apply(compute_features)
-    result = util.reset_groups(result)
-    result = util.select_columns(result, ["n_sps", "n_static", "n_moving", "n_rare", "n_home", "max_dist_home", "n_transitions", "n_top1", "n_top2", "n_top3", "n_top4", "n_top5", "entropy", "normalized_entropy"])
-    return result
+    speeds, total_dist = window.speeds_totaldist(latitude_column, longitude_column, distance_method)
+    if speed_column in df:
+        speeds = df[speed_column]
+
+    speed_average = np.nanmean(speeds)
+    speed_variance = np.nanvar(speeds)
+    speed_max = np.nanmax(speeds)
+
+    variance = np.var(lats) + np.var(lons)
+    if variance > 0:
+        log_variance = np.log(variance)
+    else:
+        log_variance = -np.inf
+
+    row = pd.Series({
+        'dist_total': total_dist,
+        'n_bins': n_bins,
+        'speed_average': speed_average,
+        'speed_variance': speed_variance,
+        'speed_max': speed_max,
+        'variance': variance,
+        'log_variance': log_variance,
+    })
+    return row
 
 
 def location_distance_features(
@@ -437,6 +814,7 @@ def location_distance_features(
         longitude_column="latitude",
         speed_column="speed",
         resample_args={"rule": default_freq},
+        distance_method="geodesic",
         **kwargs
     ):
     """Calculates features related to distance and speed.
@@ -451,50 +829,22 @@ def location_distance_features(
         latitude_column: The name of the column with latitude data in a floating point format. Defaults to 'latitude'.
         speed_column: The name of the column with speed data in a floating point format. Defaults to 'speed'.
         resample_args: a dictionary of arguments for the Pandas resample function. For example to resample by hour, you would pass {"rule": "1h"}.
+        distance_method: How distances between points are computed, "geodesic" (default) or the faster but less exact "haversine".
     """
     assert isinstance(df, pd.DataFrame), "df_u is not a pandas dataframe"
 
-    def compute_features(df):
-        """Compute features for a single user and given time interval"""
-        df = df.sort_index()  # sort based on time
-        n_bins = df.shape[0]
-
-        if n_bins == 0:
-            return None
-
-        lats = df[latitude_column]
-        lons = df[longitude_column]
-        times = df.index
+    arguments = dict(latitude_column=latitude_column, longitude_column=longitude_column,
+                     speed_column=speed_column, distance_method=distance_method)
+    return _window_features(df, [(location_distance_features, arguments)], resample_args)
 
-        speeds, total_dist = get_speeds_totaldist(lats, lons, times)
-        if speed_column in df:
-            speeds = df[speed_column]
 
-        speed_average = np.nanmean(speeds)
-        speed_variance = np.nanvar(speeds)
-        speed_max = np.nanmax(speeds)
-
-        variance = np.var(lats) + np.var(lons)
-        if variance > 0:
-            log_variance = np.log(variance)
-        else:
-            log_variance = -np.inf
-
-        row = pd.Series({
-            'dist_total': total_dist,
-            'n_bins': n_bins,
-            'speed_average': speed_average,
-            'speed_variance': speed_variance,
-            'speed_max': speed_max,
-            'variance': variance,
-            'log_variance': log_variance,
-        })
-        return row
-
-    result = util.group_data(df).resample(**resample_args, include_groups=False).apply(compute_features)
-    result = util.reset_groups(result)
-    result = util.select_columns(result, ["dist_total", "n_bins", "speed_average", "speed_variance", "speed_max", "variance", "log_variance"])
-    return result
+# Features computed from a `_LocationWindow`: the window function and
+# the columns it computes, of each feature function.
+_WINDOW_FEATURES = {
+    number_of_significant_places: (_n_significant_places_window, ["n_significant_places"]),
+    location_significant_place_features: (_significant_place_window, ["n_sps", "n_static", "n_moving", "n_rare", "n_home", "max_dist_home", "n_transitions", "n_top1", "n_top2", "n_top3", "n_top4", "n_top5", "entropy", "normalized_entropy"]),
+    location_distance_features: (_distance_window, ["dist_total", "n_bins", "speed_average", "speed_variance", "speed_max", "variance", "log_variance"]),
+}
 
 
 def location_local_time(
@@ -554,7 +904,11 @@ def extract_features_location(df, features=None):
         Default is None. If None, all the available functions are used.
         Those functions are in the dict `location.ALL_FEATURES`.
         You can implement your own function and use it instead or add it
-        to the mentioned map.
+        to the mentioned map.  The features of
+        `location_significant_place_features`, `location_distance_features`
+        and `number_of_significant_places` with the same `resample_args`
+        are computed in one pass, which sorts, computes speeds and clusters
+        each user and time window once.
 
     Returns
     -------
@@ -567,9 +921,33 @@ def extract_features_location(df, features=None):
     else:
         assert isinstance(features, dict), "Please input the features as a dictionary"
 
+    # Features computed from location windows are computed in one pass
+    # per resampling, sharing sorting, speeds and clusters.
+    passes = {}
+    for function, feature_arg in features.items():
+        if function not in _WINDOW_FEATURES:
+            continue
+        arguments = inspect.signature(function).bind(df, **feature_arg)
+        arguments.apply_defaults()
+        arguments = dict(arguments.arguments)
+        resample_args = arguments.pop("resample_args")
+        for name in ("df", "kwargs"):
+            arguments.pop(name, None)
+        key = repr(sorted(resample_args.items()))
+        passes.setdefault(key, (resample_args, []))[1].append((function, arguments))
+
+    window_features = {}
+    for resample_args, pass_features in passes.values():
+        result = _window_features(df, pass_features, resample_args)
+        for function, _ in pass_features:
+            window_features[function] = util.select_columns(result, _WINDOW_FEATURES[function][1])
+
     computed_features = []
     for features, feature_arg in features.items():
-        computed_feature = features(df, **feature_arg)
+        if features in window_features:
+            computed_feature = window_features[features]
+        else:
+            computed_feature = features(df, **feature_arg)
         computed_feature = util.set_conserved_index(computed_feature)
         computed_features.append(computed_feature)
     
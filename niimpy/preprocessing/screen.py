@@ -41,9 +41,9 @@ def util_screen(df, bat=None, screen_column_name = "screen_status", **kwargs):
         shutdown = shutdown.replace([-1,-2],0)
         
         if not shutdown.empty:
-            df = pd.concat([df, shutdown])
-            df.fillna(0, inplace=True)
+            df = util.concat([df, shutdown])
             df = df[id_columns + [screen_column_name]]
+            df = df.fillna({screen_column_name: 0})
 
     #Sort the dataframe
     df.sort_index(inplace=True)
@@ -56,7 +56,7 @@ def util_screen(df, bat=None, screen_column_name = "screen_status", **kwargs):
     df['missing'] = np.where(df['dummy']==0, 1, 0) #Check the missing points and label them as 1
     df['missing'] = df['missing'].shift(1)
     df.drop(['dummy','next'], axis=1, inplace=True)
-    df.fillna(0, inplace=True)
+    df.fillna({column: 0 for column in df.columns if column not in id_columns}, inplace=True)
    
     df = df[df.missing == 0] #Discard missing values
     df.drop(["missing"], axis=1, inplace=True)
@@ -100,7 +100,7 @@ def event_classification_screen(df, screen_column_name = "screen_status", **kwar
     
     index_name = df.index.name
     df.reset_index(inplace=True)
-    df = df.groupby(["device"]).apply(lambda x: x.iloc[:-1], include_groups=False) 
+    df = df.groupby(["device"], observed=True).apply(lambda x: x.iloc[:-1], include_groups=False) 
     
     df["use"] =  df["on"] = df["na"] = df["off"] = 0
     df.loc[(df.next=='30') | (df.next=='31') | (df.next=='32'), "use"]=1 #in use
@@ -112,8 +112,8 @@ def event_classification_screen(df, screen_column_name = "screen_status", **kwar
     
     #Discard the first and last row because they do not have all info. We do not
     #know what happened before or after these points.
-    df = df.groupby(["device"], group_keys=False).apply(lambda x: x.iloc[1:], include_groups=False)
-    df = df.groupby(["device"], group_keys=False).apply(lambda x: x.iloc[:-1], include_groups=False)
+    df = df.groupby(["device"], observed=True, group_keys=False).apply(lambda x: x.iloc[1:], include_groups=False)
+    df = df.groupby(["device"], observed=True, group_keys=False).apply(lambda x: x.iloc[:-1], include_groups=False)
     df.reset_index(["device"], inplace=True)
     
     # Set the original index. If the origianal name was none, the 
@@ -588,4 +588,7 @@ def extract_features_screen(df, bat=None, features=None):
     
     computed_features = pd.concat(computed_features, axis=1)
     computed_features = util.reset_groups(computed_features)
+    # Features computed with battery data can have more devices, and
+    # aligning different categories gives object columns.
+    computed_features = util.to_categorical(computed_features)
     return computed_features
\ No newline at end of file
@@ -339,7 +339,7 @@ def extract_features_survey(df, features=None):
     computed_features = computed_features.loc[:,~computed_features.columns.duplicated()]
 
     if 'group' in df:
-        computed_features['group'] = df.groupby('user')['group'].first()
+        computed_features['group'] = df.groupby('user', observed=True)['group'].first()
 
     computed_features = util.reset_groups(computed_features)
     return computed_features
@@ -113,8 +113,8 @@ def tracker_step_distribution(steps_df, steps_column='steps', resample_args={'ru
 
     # Convert the absolute values into distribution. This can be understood as the
     # portion of steps the users took during each hour
-    steps = df.groupby(["user"]).resample(**resample_args, include_groups=False).agg({steps_column: 'sum'})
-    step_sum = steps.reset_index(["user"]).groupby(["user"]).resample(timeframe).agg({steps_column: 'sum'})
+    steps = df.groupby(["user"], observed=True).resample(**resample_args, include_groups=False).agg({steps_column: 'sum'})
+    step_sum = steps.reset_index(["user"]).groupby(["user"], observed=True).resample(timeframe).agg({steps_column: 'sum'})
 
     steps["step_sum"] = step_sum[steps_column]
     # fill down
@@ -167,7 +167,7 @@ def extract_features_tracker(df, features=None):
     computed_features = pd.concat(computed_features, axis=1)
 
     if 'group' in df:
-        computed_features['group'] = df.groupby('user')['group'].first()
+        computed_features['group'] = df.groupby('user', observed=True)['group'].first()
 
     computed_features = util.reset_groups(computed_features)
     return computed_features
@@ -1,4 +1,5 @@
 import contextlib
+import contextvars
 from dateutil.tz import tzlocal
 import numpy as np
 import os
@@ -7,8 +8,6 @@ import re
 import sys
 import warnings
 
-from scipy import stats
-
 
 def ensure_dataframe(df):
     if df is None:
@@ -40,34 +39,57 @@ def date_range(df, start, end):
     df_new = df.loc[start:end]
     return df_new
 
+# Standard identifier columns.  Readers make these categorical.
+ID_COLUMNS = ["user", "device", "group"]
+
 #SYSTEM_TZ = tzlocal()  # the operating system timezone - for sqlite output compat
 SYSTEM_TZ = 'Europe/Helsinki'
 TZ = tzlocal()
 TZ = 'Europe/Helsinki'
 
+# Timezone set with tmp_timezone().  This is a context variable, so it
+# only applies to the current thread (or asyncio task), and parallel
+# workers do not see each other's timezones.
+_CONTEXT_TZ = contextvars.ContextVar('niimpy_tz', default=None)
+
 def set_tz(tz):
     """Globally set the preferred local timezone"""
     global TZ
     TZ = tz
 
+def get_tz(tz=None):
+    """Return the timezone to use.
+
+    This is `tz` if given, else the timezone of the innermost
+    `tmp_timezone` block of the current thread, else the global timezone
+    (see `set_tz`).  Functions taking a `tz` argument resolve it with
+    this once, and then convert times only to that timezone.
+    """
+    if tz is not None:
+        return tz
+    tz = _CONTEXT_TZ.get()
+    if tz is not None:
+        return tz
+    return TZ
+
 @contextlib.contextmanager
 def tmp_timezone(new_tz):
-    """Temporarily override the global timezone for a black.
+    """Temporarily override the timezone for a block.
 
     This is used as a context manager::
 
       with tmp_timezone('Europe/Berlin'):
           ....
 
-    Note: this overrides the global timezone.  In the future, there will
-    be a way to handle timezones as non-global variables, which should
-    be preferred.
+    The timezone applies to code running in this thread (see `get_tz`),
+    the global timezone and other threads are not affected.  Giving
+    `tz=` to reading functions explicitly is still preferred.
     """
-    global TZ
-    old_tz = TZ
-    TZ = new_tz
-    yield
-    TZ = old_tz
+    token = _CONTEXT_TZ.set(new_tz)
+    try:
+        yield
+    finally:
+        _CONTEXT_TZ.reset(token)
 
 SQLITE3_EXTENSIONS_BASENAME = os.path.join(os.path.dirname(__file__), 'sqlite-extension-functions.c')
 SQLITE3_EXTENSIONS_FILENAME = os.path.join(os.path.dirname(__file__), 'sqlite-extension-functions.so')
@@ -116,6 +138,10 @@ def read_preprocess(df, add_group=None):
         If given, add a new 'group' column with all values set to this
         given identifier.
 
+    The identifier columns ('user', 'device' and 'group', see
+    `ID_COLUMNS`) are converted to categorical, so that each distinct
+    identifier is stored once instead of once per row.
+
 
     Returns
     -------
@@ -127,42 +153,139 @@ def read_preprocess(df, add_group=None):
 
     """
     if add_group is not None:
-        df['group'] = add_group
-        #df['group'] = df['group'].astype('category')
-        #pd.Categorical(add_group)
+        df['group'] = pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), categories=[add_group])
+    return to_categorical(df)
+
+
+def to_categorical(df, id_columns=None):
+    """Convert identifier columns to categorical, in-place.
+
+    Columns which are already categorical, and identifier columns not in
+    the dataframe, are left as they are.
+
+    Returns
+    -------
+    df: dataframe
+    """
+    if id_columns is None:
+        id_columns = ID_COLUMNS
+    for column in id_columns:
+        if column in df and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
     return df
 
 
-def df_normalize(df, tz=None, old_tz=None):
+def concat(dfs, id_columns=None):
+    """Concatenate dataframes, keeping identifier columns categorical.
+
+    `pd.concat` keeps categorical columns only if their categories are
+    equal, and otherwise makes a column of strings.  Here the identifier
+    columns of all dataframes are given the union of their categories
+    before concatenating.
+
+    Parameters
+    ----------
+    dfs : list of pandas.DataFrame
+        Dataframes to concatenate.
+
+    id_columns : list of str, optional
+        Columns to keep categorical.  Default is `ID_COLUMNS`.
+
+    Returns
+    -------
+    df: dataframe
+    """
+    dfs = list(dfs)
+    if id_columns is None:
+        id_columns = ID_COLUMNS
+    for column in id_columns:
+        categories = None
+        for df in dfs:
+            if column not in df:
+                continue
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                values = df[column].cat.categories
+            else:
+                values = pd.Index(df[column].dropna().unique())
+            categories = values if categories is None else categories.union(values)
+        if categories is None:
+            continue
+        dtype = pd.CategoricalDtype(categories)
+        for i, df in enumerate(dfs):
+            if column in df and df[column].dtype != dtype:
+                dfs[i] = df = df.copy(deep=False)
+                df[column] = df[column].astype(dtype)
+    return to_categorical(pd.concat(dfs), id_columns)
+
+
+def df_normalize(df, tz=None, old_tz=None, compact=False):
     """Normalize a df (from sql) before presenting it to the user.
 
     This sets the dataframe index to the time values, and converts times
     to pandas.TimeStamp:s.  Modifies the data frame inplace.
+
+    By default the original unixtime 'time' column is kept and a
+    'datetime' column (a copy of the index) is added.  With
+    `compact=True`, the index is the only time representation (an int64
+    nanosecond epoch, with the timezone as metadata): 'time' is removed
+    and 'datetime' is not added.  Use `expand_time` to get them back
+    when needed.
     """
-    if tz is None:
+    if tz is None and _CONTEXT_TZ.get() is None:
         warnings.warn(DeprecationWarning("From now on, you should explicitely specify timezone with e.g. tz='Europe/Helsinki'.  Specify as part of the reading function."))
-        tz = TZ
+    tz = get_tz(tz)
     if 'time' in df:
-        df.index = to_datetime(df['time'])
+        # The only conversion of the times: unixtime -> UTC -> tz.
+        df.index = to_datetime(df['time'].to_numpy(), tz=tz)
         df.index.name = None
-        df['datetime'] = df.index
+        if compact:
+            del df['time']
+        else:
+            df['datetime'] = df.index
     elif 'day' in df and 'hour' in df:
-        index = df[['day', 'hour']].apply(lambda row: pd.Timestamp('%s %s:00'%(row['day'], row['hour'])), axis=1)
+        # Vectorized: parse each column at once, instead of a Timestamp
+        # per row.
+        index = pd.DatetimeIndex(pd.to_datetime(df['day'].to_numpy())
+                                 + pd.to_timedelta(pd.to_numeric(df['hour']).to_numpy(), unit='h'))
         if old_tz is not None:
             # old_tz is given - e.g. sqlite already converts it to localtime
-            index = index.dt.tz_localize(old_tz).dt.tz_convert(tz)
+            index = index.tz_localize(old_tz).tz_convert(tz)
         else:
-            index = index.dt.tz_localize(tz)
+            index = index.tz_localize(tz)
         df.index = index
         df.index.name = None
 
 
-def to_datetime(value):
+def to_datetime(value, tz=None):
+    """Convert unixtimes to datetimes in timezone `tz` (see `get_tz`)."""
+    tz = get_tz(tz)
     times = pd.to_datetime(value, unit='s', utc=True)
     if isinstance(times, pd.Series):
-        return times.dt.tz_convert(TZ)
+        return times.dt.tz_convert(tz)
     else:
-        return times.tz_convert(TZ)
+        return times.tz_convert(tz)
+
+
+def expand_time(df):
+    """Return df with 'time' and 'datetime' columns derived from the index.
+
+    This is the inverse of reading with `compact=True` (see
+    `df_normalize`), for code which needs the times as columns: 'time'
+    is unixtime (float seconds) and 'datetime' is a copy of the index.
+    Existing columns are kept as they are, and if nothing is missing `df`
+    itself is returned.  Otherwise a new DataFrame is returned; the
+    input is not modified.
+    """
+    if not isinstance(df.index, pd.DatetimeIndex):
+        return df
+    columns = {}
+    if 'time' not in df:
+        columns['time'] = df.index.as_unit('ns').asi8 / 1e9
+    if 'datetime' not in df:
+        columns['datetime'] = df.index
+    if not columns:
+        return df
+    return df.assign(**columns)
 
 
 def identifier_columns(df, id_columns = ["user", "device", "group"]):
@@ -189,7 +312,9 @@ def group_data(df, additional_columns=None, id_columns=["user", "device", "group
     elif additional_columns is None:
         additional_columns = []
     columns = identifier_columns(df, id_columns + additional_columns)
-    return df.groupby(columns)
+    # With categorical identifiers, only group by combinations which
+    # exist in the data.
+    return df.groupby(columns, observed=True)
 
 
 def reset_groups(df, additional_columns=None, id_columns = ["user", "device", "group"]):
@@ -215,11 +340,21 @@ def set_conserved_index(df, additional_columns=None, id_columns = ["user", "devi
     return df
 
 
-def set_encoding(df, to_encoding = 'utf-8', from_encoding = 'iso-8859-1'):
+def _recode(values, to_encoding, from_encoding):
+    """Recode the strings in a sequence, leaving other values as they are."""
+    return [v.encode(from_encoding).decode(to_encoding) if isinstance(v, str) else v for v in values]
+
+
+def set_encoding(df, to_encoding = 'utf-8', from_encoding = 'iso-8859-1', dtype=None):
     """ Recode the dataframe to a different encoding. This is useful when
     the encoding in a data file is set incorrectly and utf characters are
     garbled.
 
+    Each distinct string is recoded only once, and of categorical
+    columns only the categories are recoded, so repeated values (such as
+    application names) are cheap.  Values which are not strings are left
+    as they are.
+
     Parameters
     ----------
     df : pandas.DataFrame
@@ -228,6 +363,10 @@ def set_encoding(df, to_encoding = 'utf-8', from_encoding = 'iso-8859-1'):
         Encoding to convert to. Default is 'utf-8'.
     from_encoding : str
         Encoding to convert from. Default is 'iso-8859-1'.
+    dtype : str, optional
+        If given, store recoded string columns as this dtype, e.g.
+        'string[pyarrow]' for compact Arrow-backed strings.  By default
+        the dtype of each column is kept.
 
     Returns
     -------
@@ -236,8 +375,24 @@ def set_encoding(df, to_encoding = 'utf-8', from_encoding = 'iso-8859-1'):
     """
 
     for column in df.columns:
-        if df[column].dtype == 'object':
-            df[column] = df[column].str.encode(from_encoding).str.decode(to_encoding)
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            categories = series.cat.categories
+            if pd.api.types.is_string_dtype(categories.dtype):
+                df[column] = series.cat.rename_categories(_recode(categories, to_encoding, from_encoding))
+        elif series.dtype == 'object' or isinstance(series.dtype, pd.StringDtype):
+            try:
+                codes, uniques = pd.factorize(series)
+            except TypeError:
+                # Unhashable values, such as lists
+                values = np.asarray(_recode(series, to_encoding, from_encoding), dtype=object)
+            else:
+                recoded = np.asarray(_recode(uniques, to_encoding, from_encoding), dtype=object)
+                # Missing values (code -1) are kept as they are
+                values = series.to_numpy(dtype=object).copy()
+                mask = codes >= 0
+                values[mask] = recoded[codes[mask]]
+            df[column] = pd.Series(values, index=series.index, dtype=dtype if dtype is not None else series.dtype)
 
     return df
 
@@ -312,7 +467,7 @@ def aggregate(df, freq, method_numerical='mean', method_categorical='first', gro
     """
 
     #Groupby user
-    groupby = df.groupby(groups)
+    groupby = df.groupby(groups, observed=True)
 
     #Resample numerical columns -> sub_df1
     assert method_numerical in ['mean', 'sum', 'median'], \
@@ -328,17 +483,18 @@ def aggregate(df, freq, method_numerical='mean', method_categorical='first', gro
 
 
     #Resample cat columns -> sub_df2
-    cat_cols = df.select_dtypes(include=['object']).columns.to_list()
+    cat_cols = df.select_dtypes(include=['object', 'category']).columns.to_list()
     cat_cols.extend(groups)
     cat_cols = list(set(cat_cols))
 
-    groupby = df[cat_cols].groupby(groups)
+    groupby = df[cat_cols].groupby(groups, observed=True)
     assert method_categorical in ['first', 'mode', 'last']
     if method_categorical == 'first':
         sub_df2 = groupby.resample(freq, **resample_kwargs, include_groups=False).first()
     elif method_categorical == 'last':
         sub_df2 = groupby.resample(freq, **resample_kwargs, include_groups=False).last()
     elif method_categorical == 'mode':
+        from scipy import stats
         sub_df2 = groupby.resample(freq, **resample_kwargs, include_groups=False).agg(lambda x: tuple(stats.mode(x)[0]))
 
     #Merge sub_df1 and sub_df2
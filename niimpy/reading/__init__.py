@@ -1,4 +1,16 @@
-from . import mhealth
-from . import csv
-from . import google_takeout
-from . import sqlite
+import importlib
+
+# Submodules are imported on first use (PEP 562): some of them, such as
+# google_takeout, have heavy dependencies.
+_SUBMODULES = {'cache', 'csv', 'database', 'google_takeout', 'html_iterator', 'many', 'mhealth',
+               'schema', 'sqlite', 'util'}
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(__name__ + '.' + name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | _SUBMODULES)
@@ -0,0 +1,104 @@
+"""On-disk cache of normalized DataFrames.
+
+Reading and normalizing large csv files or sqlite tables can take
+minutes, and is repeated every time an analysis is run.  With
+`cache=True`, the readers (`read_csv`, `read_sqlite`) store the
+resulting DataFrame as a Parquet file, and later calls with the same
+arguments memory-map it back instead of re-reading the source.
+
+The cache key includes the path, size and modification time of the
+source file (and of the write-ahead log of sqlite databases in WAL
+mode) and all reading arguments, so changed inputs are re-read.
+The least recently used files are removed when the cache grows over
+`CACHE_MAX_SIZE` bytes.  `cache_clear()` removes all cached files.
+
+The cache directory is `$NIIMPY_CACHE_DIR`, or `niimpy` within the
+user cache directory (`$XDG_CACHE_HOME` or `~/.cache`).
+"""
+
+import glob
+import hashlib
+import os
+import tempfile
+
+import pandas as pd
+import pyarrow
+
+
+CACHE_DIR = os.environ.get(
+    'NIIMPY_CACHE_DIR',
+    os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache')), 'niimpy'))
+CACHE_MAX_SIZE = 10 * 1024**3
+
+
+def cache_key(filename, args):
+    """Return the cache key of reading `filename` with `args`."""
+    stat = os.stat(filename)
+    versions = [(stat.st_size, stat.st_mtime_ns)]
+    # In WAL mode, sqlite commits go to the -wal file until they are
+    # checkpointed, and the database file does not change.
+    wal = os.fspath(filename) + '-wal'
+    if os.path.exists(wal):
+        stat = os.stat(wal)
+        versions.append((stat.st_size, stat.st_mtime_ns))
+    key = repr((os.path.abspath(filename), versions, args))
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def cached(filename, args, read):
+    """Return `read()`, using the cache if possible.
+
+    Parameters
+    ----------
+    filename : str
+        Source file of the data.  Its path, size and modification time
+        are part of the cache key.
+
+    args : tuple
+        All other arguments which affect the result.  The repr() of
+        these is part of the cache key.
+
+    read : callable
+        Function returning the DataFrame, called if it is not cached.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+    """
+    path = os.path.join(CACHE_DIR, cache_key(filename, args) + '.parquet')
+    if os.path.exists(path):
+        os.utime(path)  # mark as recently used
+        return pd.read_parquet(path, memory_map=True)
+
+    df = read()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+    except (pyarrow.ArrowException, ValueError, TypeError):
+        # Not all DataFrames can be stored in Parquet, for example mixed
+        # type columns.  Then just don't cache.
+        os.unlink(tmp_path)
+        return df
+    _evict()
+    return df
+
+
+def _evict():
+    """Remove least recently used files until the cache fits CACHE_MAX_SIZE."""
+    files = [(os.stat(f), f) for f in glob.glob(os.path.join(CACHE_DIR, '*.parquet'))]
+    files.sort(key=lambda x: x[0].st_mtime)
+    total = sum(stat.st_size for stat, _ in files)
+    for stat, f in files:
+        if total <= CACHE_MAX_SIZE:
+            break
+        os.unlink(f)
+        total -= stat.st_size
+
+
+def cache_clear():
+    """Remove all cached files."""
+    for f in glob.glob(os.path.join(CACHE_DIR, '*.parquet')):
+        os.unlink(f)
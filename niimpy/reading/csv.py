@@ -2,14 +2,19 @@
 
 """
 
+import os
+
 import pandas as pd
 import warnings
 
+from niimpy.reading import cache as cache_
+from niimpy.reading import schema as schema_
 from niimpy.preprocessing import util
 
 
 def read_csv(filename, read_csv_options={}, add_group=None,
-             tz=None):
+             tz=None, cache=False, chunksize=None, engine=None, schema=None,
+             compact=False):
     """Read DataFrame from csv file
 
     This will read data from a csv file and then process the result with
@@ -29,19 +34,89 @@ def read_csv(filename, read_csv_options={}, add_group=None,
     add_group : object
         If given, add a 'group' column with all values set to this.
 
+    cache : bool
+        If True, cache the result on disk, see `niimpy.reading.cache`.
+        Only used when `filename` is a path and `chunksize` is not given.
+
+    chunksize : int, optional
+        If given, return an iterator of DataFrames of at most this many
+        rows each, each normalized like the full result, instead of
+        reading the whole file at once.  Compressed files are streamed
+        too, so memory use is bounded by the chunk size.  The categories
+        of identifier columns are those of each chunk, use
+        `niimpy.util.concat` (not `pd.concat`) to join chunks with
+        categorical identifier columns.
+
+    engine : str, optional
+        Parser engine of pandas.read_csv.  "pyarrow" parses the file
+        with multiple threads, and is fastest together with `schema`:
+        `read_csv(filename, tz=tz, engine="pyarrow", schema=True)`.
+        Can not be used with `chunksize`.
+
+    schema : bool or str or dict, optional
+        Column types to read the data as, see `niimpy.reading.schema`.
+        If True, use the schema of the known sensor in the file name
+        (e.g. "AwareBattery").  A table name or a dict of column name ->
+        dtype can also be given.
+
+    compact : bool
+        If True, keep the times only as the index, without the 'time'
+        and 'datetime' columns (see `niimpy.util.df_normalize`).  These
+        can be added back with `niimpy.util.expand_time`.
+
     """
     if tz is None:
         warnings.warn(DeprecationWarning("From now on, you should explicitely specify timezone with e.g. tz='Europe/Helsinki'"), stacklevel=2)
+    # Resolve the timezone once, all times of this read are converted
+    # to it (see util.get_tz).
+    tz = util.get_tz(tz)
+
+    if engine == 'pyarrow' and chunksize is not None:
+        raise ValueError("The pyarrow engine does not support chunksize")
+    if schema is True:
+        schema = schema_.guess_table(filename)
+        schema = schema_.get_schema(schema)
+    elif isinstance(schema, str):
+        schema = schema_.get_schema(schema)
+    if schema or engine is not None:
+        read_csv_options = dict(read_csv_options)
+        # The pyarrow engine only converts dtypes after parsing, so it is
+        # faster to leave all conversion to apply_schema.
+        if schema and engine != 'pyarrow':
+            read_csv_options['dtype'] = {**schema_.parser_dtypes(schema), **read_csv_options.get('dtype', {})}
+        if engine is not None:
+            read_csv_options['engine'] = engine
+
+    if chunksize is not None:
+        return _iter_csv(filename, read_csv_options, add_group, tz, chunksize, schema, compact)
+
+    if cache and isinstance(filename, (str, os.PathLike)):
+        return cache_.cached(filename, ('csv', read_csv_options, add_group, tz, schema, compact),
+                             lambda: read_csv(filename, read_csv_options, add_group=add_group, tz=tz, schema=schema,
+                                              compact=compact))
 
     df = pd.read_csv(filename, **read_csv_options)
 
     # df_normalize converts sets the index to time values and does other time
     # conversions.  Inplace.
-    util.df_normalize(df, tz=tz)
+    util.df_normalize(df, tz=tz, compact=compact)
     df = util.read_preprocess(df, add_group=add_group)
+    if schema:
+        df = schema_.apply_schema(df, schema)
     return df
 
 
+def _iter_csv(filename, read_csv_options, add_group, tz, chunksize, schema, compact):
+    """Iterate over normalized chunks of a csv file, see read_csv."""
+    with pd.read_csv(filename, chunksize=chunksize, **read_csv_options) as reader:
+        for df in reader:
+            util.df_normalize(df, tz=tz, compact=compact)
+            df = util.read_preprocess(df, add_group=add_group)
+            if schema:
+                df = schema_.apply_schema(df, schema)
+            yield df
+
+
 def read_csv_string(string, tz=None):
     """Parse a string containing CSV and return dataframe
 
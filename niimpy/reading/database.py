@@ -51,12 +51,20 @@ from numbers import Number
 import os
 import sqlite3
 import sys
+import threading
+from urllib.request import pathname2url
 
 import dateutil.parser
+import numpy as np
 import pandas as pd
 
 from niimpy.preprocessing import util
 
+# sqlite settings of read-only pooled connections: memory-map up to
+# 256 MiB of the database file and use a 64 MiB page cache.
+POOLED_MMAP_SIZE = 256 * 1024**2
+POOLED_CACHE_SIZE = -64 * 1024  # negative values are in KiB
+
 class ALL:
     """Sentinel value for all users"""
     pass
@@ -69,9 +77,63 @@ class ALL:
 #    selectors.append('{0} < time'.format(x))
 #    return ' AND time<'
 
-def open(db, tz=None):
+def open(db, tz=None, ensure_indexes=False, pooled=False):
     """Open a database and return a Data1 object"""
-    return Data1(db, tz=tz)
+    return Data1(db, tz=tz, ensure_indexes=ensure_indexes, pooled=pooled)
+
+
+def utcoffsets(tz, tmin, tmax):
+    """Return the UTC offsets of a timezone within a time range.
+
+    Returns a list of (start, offset) tuples, in seconds: from unixtime
+    `start` until the next start, local time is unixtime + offset.  The
+    first start is None, meaning the offset applies to all earlier times
+    as well, and the last offset applies to all later times.
+
+    Offsets are first computed hourly over the range and each change is
+    then located to the second, so this is fast even for long ranges.
+    """
+    def offsets(times):
+        utc = pd.to_datetime(np.asarray(times), unit='s', utc=True)
+        local = utc.tz_convert(tz).tz_localize(None)
+        return np.asarray((local - utc.tz_localize(None)) // pd.Timedelta(seconds=1))
+
+    hours = np.arange(int(tmin // 3600) * 3600, int(tmax) + 3601, 3600)
+    hourly = offsets(hours)
+    result = [(None, int(hourly[0]))]
+    for i in np.nonzero(np.diff(hourly))[0]:
+        lo, hi = int(hours[i]), int(hours[i+1])
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if offsets([mid])[0] == hourly[i]:
+                lo = mid
+            else:
+                hi = mid
+        result.append((hi, int(hourly[i+1])))
+    return result
+
+
+def _sql_utcoffset(offsets, column='time'):
+    """SQL expression of the UTC offset (seconds) of a unixtime column.
+
+    `offsets` is the output of utcoffsets().
+    """
+    if len(offsets) == 1:
+        return str(offsets[0][1])
+    cases = " ".join("WHEN {0} < {1} THEN {2}".format(column, start, prev_offset)
+                     for (_, prev_offset), (start, _) in zip(offsets[:-1], offsets[1:]))
+    return "(CASE {0} ELSE {1} END)".format(cases, offsets[-1][1])
+
+
+# Aggregate functions which can be computed within sqlite, with the same
+# result as in pandas.
+SQL_AGGREGATES = {
+    'mean': 'avg',
+    'sum': 'sum',
+    'count': 'count',
+    'min': 'min',
+    'max': 'max',
+}
 
 
 # Online variance calculation
@@ -113,25 +175,65 @@ class Data1(object):
 
     This opens a database and provides methods to do common operations.
     """
-    def __init__(self, db, tz=None):
+    def __init__(self, db, tz=None, ensure_indexes=False, pooled=False):
         """Open the database.
 
         Don't do anything yet, but stores the open connection object on
         self.conn for future functions to use.
+
+        If `ensure_indexes` is true, create (user, time) indexes on all
+        tables, see .ensure_indexes().  This writes to the database.
+
+        If `pooled` is true, the database is opened read-only, with one
+        connection per thread (self.conn returns the connection of the
+        current thread).  Then the reading methods can be used from
+        multiple threads at once, for example from a
+        concurrent.futures.ThreadPoolExecutor.  If the database is in
+        WAL mode, this also does not block other processes writing to
+        it.
         """
         if not os.path.exists(db):
             raise FileNotFoundError("Database does not exist: {}".format(db))
-        self.conn = sqlite3.connect(db)
-        if os.path.exists(util.SQLITE3_EXTENSIONS_FILENAME):
-            self.conn.enable_load_extension(True)
-            self.conn.load_extension(util.SQLITE3_EXTENSIONS_FILENAME)
+        if pooled and ensure_indexes:
+            raise ValueError("ensure_indexes can not be used with a read-only pooled database")
+        self._db = db
+        self._pooled = pooled
+        self._local = threading.local()
+        self._has_extensions = os.path.exists(util.SQLITE3_EXTENSIONS_FILENAME)
+        self._conn = None if pooled else self._connect()
+        self._singleuser = self._is_single_user()
+        self._tz = tz
+        if ensure_indexes:
+            self.ensure_indexes()
+
+    def _connect(self):
+        """Open a new connection to the database."""
+        if self._pooled:
+            uri = 'file:{}?mode=ro'.format(pathname2url(os.path.abspath(self._db)))
+            conn = sqlite3.connect(uri, uri=True)
+            conn.execute('PRAGMA mmap_size = {}'.format(POOLED_MMAP_SIZE))
+            conn.execute('PRAGMA cache_size = {}'.format(POOLED_CACHE_SIZE))
         else:
-            self.conn.create_aggregate("stdev", 1, sqlite3_stdev)
+            conn = sqlite3.connect(self._db)
+        if self._has_extensions:
+            conn.enable_load_extension(True)
+            conn.load_extension(util.SQLITE3_EXTENSIONS_FILENAME)
+        else:
+            conn.create_aggregate("stdev", 1, sqlite3_stdev)
             #print("SQLite3 extension module not available, some functions will not work.", file=sys.stderr)
             #print("Future niimpy versions will improve this.", file=sys.stderr)
             #print("({0})".format(util.SQLITE3_EXTENSIONS_FILENAME), file=sys.stderr)
-        self._singleuser = self._is_single_user()
-        self._tz = tz
+        return conn
+
+    @property
+    def conn(self):
+        """The sqlite3 connection (of this thread, if pooled)."""
+        if not self._pooled:
+            return self._conn
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
 
     def _is_single_user(self):
         """Detect if this is a single-user database
@@ -141,23 +243,27 @@ class Data1(object):
         and thus requires a little bit of special-casing.  Not much, but
         some.
         """
-        tables = self.tables()
-        for table in tables:
-            if table == 'errors': continue
-            # Using pragma_table_info would be better, but this
-            # requires about sqlite 3.16 or above, which is a bit much
-            # (requires ubuntu 18.04 or anaconda).
-            try:
-                self.conn.execute("SELECT user FROM \"%s\" LIMIT 1"%table).fetchall()
-            except sqlite3.OperationalError as e:
-                if 'no such column' in e.args[0]:
-                    self._singleuser = True
-                    #print("Detected single-user database", file=sys.stderr)
-                    return True
-                else:
-                    raise
+        for table in self.tables():
+            if 'user' not in self._columns(table):
+                return True
         return False
 
+    def _metadata(self):
+        """Return the cache of table metadata.
+
+        Column lists, user sets and row counts are cached here, since
+        computing them requires reading through whole tables.  The cache
+        is cleared whenever the database has been modified, by this or
+        any other connection (detected with PRAGMA data_version).  Since
+        the data_version is per connection, so is the cache.
+        """
+        version = (self.conn.execute('PRAGMA data_version').fetchone()[0],
+                   self.conn.total_changes)
+        if version != getattr(self._local, 'metadata_version', None):
+            self._local.metadata_cache = {}
+            self._local.metadata_version = version
+        return self._local.metadata_cache
+
     def execute(self, *args, **kwargs):
         """Execute rauw SQL code.
 
@@ -170,7 +276,62 @@ class Data1(object):
         """List all tables that are inside of this database.
 
         Returns a set."""
-        return {x[0] for x in self.conn.execute('SELECT name FROM sqlite_master WHERE type="table"') if x[0]!='errors'}
+        cache = self._metadata()
+        if 'tables' not in cache:
+            cache['tables'] = {x[0] for x in self.conn.execute('SELECT name FROM sqlite_master WHERE type="table"') if x[0]!='errors'}
+        return set(cache['tables'])
+
+    def _columns(self, table):
+        """Return the list of column names of a table."""
+        cache = self._metadata()
+        if ('columns', table) not in cache:
+            cache['columns', table] = [x[1] for x in self.conn.execute('PRAGMA table_info("%s")'%table)]
+        return list(cache['columns', table])
+
+    def _table_counts(self, table):
+        """Return a dict of user -> number of rows in a table.
+
+        For single-user databases, the only key is None."""
+        cache = self._metadata()
+        if ('counts', table) not in cache:
+            if self._singleuser:
+                counts = {None: self.conn.execute('SELECT count(*) FROM "%s"'%table).fetchone()[0]}
+            else:
+                counts = dict(self.conn.execute('SELECT user, count(*) FROM "%s" GROUP BY user'%table))
+            cache['counts', table] = counts
+        return dict(cache['counts', table])
+
+    def ensure_indexes(self):
+        """Create indexes for the user and time filters of all tables.
+
+        Queries filter by "user=:user AND start <= time AND time < end".
+        Without an index, each of these is a full table scan.  This
+        creates an index on (user, time) (or only (time) for single-user
+        tables) on every table that has a time column, unless it
+        already exists.  This writes to the database file.
+        """
+        for table in sorted(self.tables()):
+            columns = self._columns(table)
+            if 'time' not in columns:
+                continue
+            if 'user' in columns:
+                index_name, index_columns = '%s_user_time'%table, 'user, time'
+            else:
+                index_name, index_columns = '%s_time'%table, 'time'
+            self.conn.execute('CREATE INDEX IF NOT EXISTS "{0}" ON "{1}" ({2})'.format(
+                index_name, table, index_columns))
+        self.conn.commit()
+
+    def explain(self, table, user, limit=None, offset=None, start=None, end=None):
+        """Return the sqlite query plan of a .raw() query.
+
+        Takes the same arguments as .raw() and returns the output of
+        "EXPLAIN QUERY PLAN" as a DataFrame.  The 'detail' column shows
+        if the query uses an index ("SEARCH ... USING INDEX") or reads
+        the whole table ("SCAN ...").
+        """
+        return pd.read_sql("EXPLAIN QUERY PLAN " + self._sql_raw(table, user, limit=limit, offset=offset, start=start, end=end),
+                           self.conn, params={'user':user})
 
     def _sql_where_user(self, user):
         """Query generation convenience.
@@ -270,7 +431,7 @@ class Data1(object):
         else:                  tables = self.tables()
         users = set()
         for table_ in tables:
-            users |= {x[0] for x in self.conn.execute('SELECT DISTINCT user FROM "%s"'%table_)}
+            users |= set(self._table_counts(table_))
         return users
 
     def validate_username(self, user):
@@ -301,20 +462,15 @@ class Data1(object):
         counts of that user in that table.
         """
         if self._singleuser:
-            #print(self.tables())
             user_stats = pd.DataFrame(index=sorted(self.tables()), columns=("count",))
-            #print(user_stats)
-            cur = self.conn.cursor()
             for table_ in self.tables():
-                for count, in cur.execute('SELECT count(*) FROM "{table}"'.format(table=table_, **self._sql(user=ALL))):
-                    user_stats[table_, 'count'] = count
+                user_stats.loc[table_, 'count'] = self._table_counts(table_)[None]
             return user_stats
         user_stats = pd.DataFrame(index=sorted(self.tables()), columns=sorted(self.users()))
-        cur = self.conn.cursor()
         for table_ in self.tables():
-            for user, count in cur.execute('SELECT {select_user} count(*) FROM "{table}" GROUP BY user'.format(table=table_, **self._sql(user=ALL))):
+            for user, count in self._table_counts(table_).items():
                 if user is None: continue
-                user_stats[user][table_] = count
+                user_stats.loc[table_, user] = count
         return user_stats
 
     def first(self, table, user, start=None, end=None, offset=None, _aggregate="min", _limit=None):
@@ -336,7 +492,7 @@ class Data1(object):
         if df.empty:
             return None
         if 'time' in df:
-            df['datetime'] = util.to_datetime(df['time'])
+            df['datetime'] = util.to_datetime(df['time'], tz=self._tz)
         return df
     def last(self, *args, **kwargs):
         """Return the latest timestamp.
@@ -358,33 +514,208 @@ class Data1(object):
         return self.count(*args, _limit=1, **kwargs) >= 1
 
 
+    def _time_range(self, table, user, start=None, end=None):
+        """Return the minimum and maximum unixtime of a query."""
+        return self.conn.execute("""SELECT min(time), max(time)
+                                    FROM "{table}"
+                                    WHERE 1 {where_user} {where_daterange}
+                                 """.format(table=table, **self._sql(user=user, start=start, end=end)),
+                                 {'user':user}).fetchone()
+
+    def aggregate(self, table, user, column, func='mean', rule='1h', start=None, end=None):
+        """Resample and aggregate a column within sqlite.
+
+        This computes the same as `niimpy.util.aggregate` on the data of
+        one column (grouped by user), but the binning is done by integer
+        division of the unixtime within sqlite, so only the aggregated
+        values are read into Python.
+
+        Bins are aligned to the local midnight of the first day of the
+        data, like pandas resampling does.  For rules which evenly divide
+        a day, such as "30min", "1h" or "1D", the result is the same as
+        with pandas.  Multi-user data is binned with one alignment for
+        all users.
+
+        Parameters
+        ----------
+        table : str
+            Table name
+
+        user : str or ALL
+            User to read
+
+        column : str
+            Column to aggregate
+
+        func : str
+            One of 'mean', 'sum', 'count', 'min', 'max'.
+
+        rule : str
+            Pandas fixed frequency, such as "30min", "1h" or "1D".
+
+        start, end : optional
+            Time range to read, see .raw().
+
+        Returns
+        -------
+        df : pandas.DataFrame
+            Indexed by the start time of each bin, with columns `user`
+            (if the database is multi-user, also when one user is read)
+            and `column`.  Empty bins
+            between the first and last bin of each user are included.
+        """
+        if func not in SQL_AGGREGATES:
+            raise ValueError("func must be one of {}, not {!r}".format(sorted(SQL_AGGREGATES), func))
+        freq = pd.tseries.frequencies.to_offset(rule)
+        tz = util.get_tz(self._tz)
+        sql = self._sql(user=user, start=start, end=end)
+        id_columns = [] if self._singleuser else ['user']
+
+        tmin, tmax = self._time_range(table, user, start=start, end=end)
+        if tmin is None:
+            return pd.DataFrame(columns=id_columns + [column], index=pd.DatetimeIndex([], tz=tz))
+        origin = pd.Timestamp(tmin, unit='s', tz='UTC').tz_convert(tz).normalize()
+
+        if isinstance(freq, pd.offsets.Day):
+            # Days are binned in local time, so that bins start at midnight.
+            width = freq.n * 86400
+            local_origin = origin.tz_localize(None).value // 10**9
+            utcoffset = _sql_utcoffset(utcoffsets(tz, tmin, tmax))
+            bucket = "CAST((time + {0} - {1}) / {2} AS INTEGER)".format(utcoffset, local_origin, width)
+        elif isinstance(freq, pd.offsets.Tick):
+            width = freq.nanos / 10**9
+            bucket = "CAST((time - {0}) / {1} AS INTEGER)".format(origin.value // 10**9, width)
+        else:
+            raise ValueError("Only fixed frequencies can be aggregated within sqlite, not {!r}".format(rule))
+
+        # "+ 0" converts numbers stored as text, so that they are not
+        # compared as strings.
+        df = pd.read_sql("""SELECT {select_user} {bucket} AS bucket, {func}("{column}" + 0) AS "{column}"
+                            FROM "{table}"
+                            WHERE 1 {where_user} {where_daterange}
+                            GROUP BY {group_by}
+                         """.format(table=table, column=column, bucket=bucket,
+                                    func=SQL_AGGREGATES[func],
+                                    group_by=", ".join(id_columns + ['bucket']),
+                                    **sql),
+                         self.conn, params={'user':user})
+        if id_columns and not sql['select_user']:
+            df.insert(0, 'user', user)
+
+        # Add empty bins, like pandas resampling does.
+        fill_value = 0 if func in ('sum', 'count') else np.nan
+        parts = df.groupby(id_columns) if id_columns else [((), df)]
+        result = []
+        for ids, part in parts:
+            buckets = np.arange(part['bucket'].min(), part['bucket'].max() + 1)
+            part = part.set_index('bucket')[[column]].reindex(buckets, fill_value=fill_value)
+            for id_column, id_ in zip(id_columns, ids):
+                part.insert(0, id_column, id_)
+            result.append(part)
+        df = pd.concat(result)
+
+        if isinstance(freq, pd.offsets.Day):
+            index = origin.tz_localize(None) + pd.to_timedelta(df.index * width, unit='s')
+            index = index.tz_localize(tz, ambiguous=True, nonexistent='shift_forward')
+        else:
+            index = origin + pd.to_timedelta(df.index * width, unit='s')
+        df.index = pd.DatetimeIndex(index)
+        df.index.name = None
+        return df
+
+    def _sql_utcoffset(self, table, user, start=None, end=None):
+        """Query generation convenience.
+
+        Generates a SQL expression of the UTC offset (in seconds) of the
+        'time' column, in the timezone of this database, so that
+        time + offset is the local time.  Offsets are computed for the
+        time range of the query, so that this is a short CASE expression
+        instead of depending on the timezone of the machine (as
+        sqlite's 'localtime' does).
+        """
+        tz = util.get_tz(self._tz)
+        tmin, tmax = self._time_range(table, user, start=start, end=end)
+        if tmin is None:
+            return "0"
+        return _sql_utcoffset(utcoffsets(tz, tmin, tmax))
+
+    def _set_day_hour_index(self, df):
+        """Set the index of a table with day, hour and utcoffset columns.
+
+        The utcoffset column (local time - UTC, in seconds) is removed.
+        """
+        tz = util.get_tz(self._tz)
+        local = pd.to_datetime(df['day'], format='%Y-%m-%d') + pd.to_timedelta(df['hour'], unit='h')
+        utc = local - pd.to_timedelta(df.pop('utcoffset'), unit='s')
+        df.index = pd.DatetimeIndex(utc).tz_localize('UTC').tz_convert(tz)
+        df.index.name = None
+
     def occurrence(self, table, user, bin_width=720, limit=None, offset=None, start=None, end=None):
+        """Hourly occurrence: number of bins of bin_width seconds with data.
+
+        Day and hour are in the local time of the database timezone.
+        """
         n_intervals = 3600 / bin_width
         interval_width = 60/n_intervals
-        df = pd.read_sql("""SELECT {select_user} day, hour,
+        sql = self._sql(user=user, limit=limit, offset=offset, start=start, end=end)
+        group_by = "user, day, hour" if sql['select_user'] else "day, hour"
+        df = pd.read_sql("""SELECT {select_user} day, hour, max(utcoffset) AS utcoffset,
                                 count(*) as occurrence, sum(bin_count) as count, group_concat(interval) AS withdata
                             FROM (
-                                SELECT
-                                  strftime('%Y-%m-%d', time, 'unixepoch', 'localtime') AS day,
-                                  CAST(strftime('%H', time, 'unixepoch', 'localtime') AS INTEGER) AS hour,
-                                  CAST(strftime('%M', time, 'unixepoch', 'localtime')/:interval_width AS INTEGER) AS interval,
+                                SELECT {select_user}
+                                  strftime('%Y-%m-%d', localtime, 'unixepoch') AS day,
+                                  CAST(strftime('%H', localtime, 'unixepoch') AS INTEGER) AS hour,
+                                  CAST(strftime('%M', localtime, 'unixepoch')/:interval_width AS INTEGER) AS interval,
+                                  max(utcoffset) AS utcoffset,
                                   count(*) as bin_count
-                                 FROM "{table}"
-                                 WHERE 1 {where_user} {where_daterange}
-                                 GROUP BY day, hour, interval
+                                 FROM (
+                                     SELECT *, time + {utcoffset} AS localtime, {utcoffset} AS utcoffset
+                                     FROM "{table}"
+                                     WHERE 1 {where_user} {where_daterange}
+                                 )
+                                 GROUP BY {group_by}, interval
                                  {limit}
                                 )
-                            GROUP BY day, hour
-                        """.format(table=table,
-                                   **self._sql(user=user, limit=limit, offset=offset, start=start, end=end)),
+                            GROUP BY {group_by}
+                        """.format(table=table, group_by=group_by,
+                                   utcoffset=self._sql_utcoffset(table, user, start=start, end=end),
+                                   **sql),
                         self.conn, params={'user':user, 'interval_width':interval_width})
-        util.df_normalize(df, old_tz=util.SYSTEM_TZ, tz=self._tz)
+        self._set_day_hour_index(df)
         return df
 
 
-    def hourly(self, table, user, columns=[], limit=None, offset=None, start=None, end=None):
+    def hourly(self, table, user, columns=[], limit=None, offset=None, start=None, end=None, engine=None):
+        """Hourly count, and mean, std and count of columns.
+
+        Returns one row per (user, day, hour), with the number of rows
+        and, for each of `columns`, {column}_mean, {column}_std and
+        {column}_count.  Day and hour are in the local time of the
+        database timezone.
+
+        engine : 'sql' or 'pandas', optional
+            With 'sql', the aggregation is done within sqlite.  With
+            'pandas', the columns are read in bulk and aggregated with a
+            pandas groupby.  The results are the same, but 'sql' is
+            slow when the compiled sqlite extension functions are not
+            installed (the stdev function is then called in Python once
+            per row), so by default 'pandas' is used in that case.
+        """
         if isinstance(columns, str):
             columns = [columns]
+        if engine is None:
+            engine = 'sql' if self._has_extensions else 'pandas'
+        if engine not in ('sql', 'pandas'):
+            raise ValueError("engine must be 'sql' or 'pandas', not {!r}".format(engine))
+        sql = self._sql(user=user, limit=limit, offset=offset, start=start, end=end)
+        sql['utcoffset'] = self._sql_utcoffset(table, user, start=start, end=end)
+        group_by = "user, day, hour" if sql['select_user'] else "day, hour"
+
+        if engine == 'pandas':
+            df = self._hourly_pandas(table, user, columns, limit, sql)
+            self._set_day_hour_index(df)
+            return df
+
         if columns:
             column_selector = ",\n".join("    avg({0}) AS {0}_mean, stdev({0}) AS {0}_std, count({0}) AS {0}_count".format(c) for c in columns)
             column_selector = ',\n'+column_selector
@@ -393,21 +724,60 @@ class Data1(object):
 
         df = pd.read_sql("""SELECT
                                 {select_user}
-                                strftime('%Y-%m-%d', time, 'unixepoch', 'localtime') AS day,
-                                CAST(strftime('%H', time, 'unixepoch', 'localtime') AS INTEGER) AS hour,
+                                strftime('%Y-%m-%d', time + {utcoffset}, 'unixepoch') AS day,
+                                CAST(strftime('%H', time + {utcoffset}, 'unixepoch') AS INTEGER) AS hour,
+                                max({utcoffset}) AS utcoffset,
                                 count(*) as count {column_selector}
                             FROM (
                                 SELECT * FROM "{table}" {order_by} {limit}
                                 )
                             WHERE 1 {where_user} {where_daterange}
-                            GROUP BY day, hour
+                            GROUP BY {group_by}
                             {limit}
-                         """.format(table=table, column_selector=column_selector,
-                                   **self._sql(user=user, limit=limit, offset=offset, start=start, end=end)),
+                         """.format(table=table, column_selector=column_selector, group_by=group_by,
+                                   **sql),
                          self.conn, params={'user':user})
-        util.df_normalize(df, old_tz=util.SYSTEM_TZ, tz=self._tz)
+        self._set_day_hour_index(df)
         return df
 
+    def _hourly_pandas(self, table, user, columns, limit, sql):
+        """Pandas implementation of .hourly(), see there.
+
+        Only the day and hour are computed within sqlite, the
+        aggregation is done in bulk using pandas.  To match the sqlite
+        functions, each column is read twice: converted to a number like
+        avg() does (for mean and count), and with non-numeric values set
+        to NULL like stdev() does (for the population standard
+        deviation).
+        """
+        column_selector = "".join(
+            """, "{0}" + 0.0 AS "{0}_value",
+                 CASE WHEN typeof("{0}") IN ('integer', 'real') THEN "{0}" END AS "{0}_number"
+            """.format(c) for c in columns)
+        df = pd.read_sql("""SELECT
+                                {select_user}
+                                strftime('%Y-%m-%d', time + {utcoffset}, 'unixepoch') AS day,
+                                CAST(strftime('%H', time + {utcoffset}, 'unixepoch') AS INTEGER) AS hour,
+                                {utcoffset} AS utcoffset
+                                {column_selector}
+                            FROM (
+                                SELECT * FROM "{table}" {order_by} {limit}
+                                )
+                            WHERE 1 {where_user} {where_daterange}
+                         """.format(table=table, column_selector=column_selector, **sql),
+                         self.conn, params={'user':user})
+        keys = [df[k] for k in ('user', 'day', 'hour') if k in df]
+        result = df.groupby(keys, dropna=False).size().to_frame('count')
+        result['utcoffset'] = df['utcoffset'].groupby(keys, dropna=False).max()
+        for c in columns:
+            values = df[c+'_value'].astype(float).groupby(keys, dropna=False)
+            result[c+'_mean'] = values.mean()
+            result[c+'_std'] = df[c+'_number'].astype(float).groupby(keys, dropna=False).std(ddof=0)
+            result[c+'_count'] = values.count()
+        result = result.reset_index()
+        if limit is not None:
+            result = result.head(int(limit))
+        return result
 
     def timestamps(self, table, user, limit=None, offset=None, start=None, end=None):
         df = pd.read_sql("""SELECT
@@ -422,33 +792,80 @@ class Data1(object):
                         self.conn, params={'user':user})
         if 'user' not in df:
             # Single user data:
-            return util.to_datetime(df['time'])
+            return util.to_datetime(df['time'], tz=self._tz)
         else:
             util.df_normalize(df, tz=self._tz)
             return df
 
-    def raw(self, table, user, limit=None, offset=None, start=None, end=None):
+    def _sql_raw(self, table, user, limit=None, offset=None, order=False, start=None, end=None):
+        """Query generation for .raw() and related functions."""
+        return """SELECT
+                      *
+                  FROM "{table}"
+                  WHERE 1 {where_user} {where_daterange}
+                  {order_by}
+                  {limit}
+               """.format(table=table,
+                          **self._sql(user=user, limit=limit, offset=offset, order=order, start=start, end=end))
+
+    def raw(self, table, user, limit=None, offset=None, start=None, end=None, compact=False):
         """Read all data in a table and return it as a DataFrame.
 
         This reads all data (subject to several possible filters) and
-        returns it as a DataFrame.
+        returns it as a DataFrame.  With `compact=True`, the index is the
+        only time representation (see `util.df_normalize`).
         """
-        df = pd.read_sql("""SELECT
-                                *
-                            FROM "{table}"
-                            WHERE 1 {where_user} {where_daterange}
-                            {order_by}
-                            {limit}
-                        """.format(table=table,
-                                   **self._sql(user=user, limit=limit, offset=offset, start=start, end=end)
-                                   #select_user=self._sql_select_user(user),  where_user=self._sql_where_user(user),
-                                   #limit=self._sql_limit(limit)
-                                   ),
+        df = pd.read_sql(self._sql_raw(table, user, limit=limit, offset=offset, start=start, end=end),
                         self.conn, params={'user':user})
         if 'time' in df:
-            util.df_normalize(df, tz=self._tz)
+            util.df_normalize(df, tz=self._tz, compact=compact)
         return df
 
+    def iter_raw(self, table, user, chunksize=100000, limit=None, offset=None, start=None, end=None, compact=False):
+        """Iterate over all data in a table, in chunks of DataFrames.
+
+        This is like .raw(), but instead of returning all data at once,
+        yields DataFrames of at most `chunksize` rows.  Rows are ordered
+        by time and each chunk is normalized the same way as .raw(), so
+        data can be processed with bounded memory.
+        """
+        chunks = pd.read_sql(self._sql_raw(table, user, limit=limit, offset=offset, order=True, start=start, end=end),
+                             self.conn, params={'user':user}, chunksize=chunksize)
+        for df in chunks:
+            if 'time' in df:
+                util.df_normalize(df, tz=self._tz, compact=compact)
+            yield df
+
+    def iter_users(self, table, users=None, start=None, end=None, compact=False):
+        """Iterate over data in a table, one user at a time.
+
+        Yields (user, DataFrame) pairs, like iterating over a groupby.
+        The same query is re-executed with a different user parameter,
+        so sqlite can reuse the prepared statement and, if there is an
+        index on (user, time), only read each user's rows.  Only one
+        user's data is held in memory at once.
+
+        If `users` is not given, all users in the table are used.  For a
+        single-user database, a single (None, DataFrame) pair is yielded.
+        """
+        if self._singleuser:
+            yield None, self.raw(table, ALL, start=start, end=end, compact=compact)
+            return
+        if users is None:
+            users = sorted(self.users(table))
+        query = """SELECT
+                       *
+                   FROM "{table}"
+                   WHERE user=:user {where_daterange}
+                   ORDER BY time
+                """.format(table=table,
+                           where_daterange=self._sql_where_daterange(start, end))
+        for user in users:
+            df = pd.read_sql(query, self.conn, params={'user':user})
+            if 'time' in df:
+                util.df_normalize(df, tz=self._tz, compact=compact)
+            yield user, df
+
     def get_survey_score(self, table, user, survey, limit=None, start=None, end=None):
         """Get the survey results, summing scores.
 
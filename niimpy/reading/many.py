@@ -0,0 +1,118 @@
+"""Read many files at once, such as a whole study directory.
+
+Study data is often stored as one file per participant (and sensor).
+`read_many` reads all of them in parallel processes, labels the rows of
+each file with a user and/or group derived from its path, and
+concatenates the results once, with categorical identifier columns.
+"""
+
+import concurrent.futures
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from niimpy.reading.csv import read_csv
+from niimpy.reading.sqlite import read_sqlite
+from niimpy.preprocessing import util
+
+SQLITE_EXTENSIONS = ('.sqlite', '.sqlite3', '.db')
+# Suffixes removed from file names, to get user or group names
+COMPRESSION_EXTENSIONS = ('.gz', '.bz2', '.zip', '.xz')
+DATA_EXTENSIONS = ('.csv',) + SQLITE_EXTENSIONS
+
+
+def _name_from_path(path, name_from):
+    """Derive a user or group name from a file path."""
+    if callable(name_from):
+        return name_from(path)
+    if name_from == 'filename':
+        # Only known extensions are removed, user ids may contain dots.
+        name = os.path.basename(path)
+        for extensions in (COMPRESSION_EXTENSIONS, DATA_EXTENSIONS):
+            root, ext = os.path.splitext(name)
+            if ext.lower() in extensions:
+                name = root
+        return name
+    if name_from == 'dirname':
+        return os.path.basename(os.path.dirname(os.path.abspath(path)))
+    raise ValueError("Unknown name source {!r}, use 'filename', 'dirname' or a function".format(name_from))
+
+
+def _read_one(path, table, tz, kwargs):
+    """Read a single file, in a worker process."""
+    if path.endswith(SQLITE_EXTENSIONS):
+        if table is None:
+            raise ValueError("table must be given to read sqlite databases: {}".format(path))
+        return read_sqlite(path, table, tz=tz, **kwargs)
+    return read_csv(path, tz=tz, **kwargs)
+
+
+def read_many(files, tz=None, table=None, user_from=None, group_from=None, n_jobs=None, **kwargs):
+    """Read many csv or sqlite files into one DataFrame.
+
+    Parameters
+    ----------
+    files : str or list of str
+        A glob pattern (e.g. "study/*/AwareBattery.csv") or a list of
+        file names.  Files ending in .sqlite, .sqlite3 or .db are read
+        with `read_sqlite`, others with `read_csv`.
+
+    tz : str
+        Timezone, passed to the reading functions.  If not given, the
+        current timezone (`niimpy.util.get_tz`) is resolved here, since
+        worker processes do not see it.
+
+    table : str, optional
+        Table to read from sqlite databases.
+
+    user_from : str or callable, optional
+        If given, add a 'user' column derived from the path of each
+        file: 'filename' (file name without a compression extension
+        and a .csv, .sqlite, .sqlite3 or .db extension), 'dirname' (name
+        of the containing directory), or a function of the path.
+
+    group_from : str or callable, optional
+        Same as `user_from`, for the 'group' column.
+
+    n_jobs : int, optional
+        Number of processes to read files with.  Default is the number
+        of CPUs.  With 1, files are read in this process.
+
+    **kwargs
+        Other arguments to `read_csv` or `read_sqlite`.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+        Data of all files.  The 'user', 'device' and 'group' columns are
+        categorical.
+    """
+    tz = util.get_tz(tz)
+    if isinstance(files, (str, os.PathLike)):
+        files = sorted(glob.glob(os.fspath(files)))
+    files = [os.fspath(f) for f in files]
+    if not files:
+        raise FileNotFoundError("No files to read")
+
+    args = ([table]*len(files), [tz]*len(files), [kwargs]*len(files))
+    if n_jobs == 1:
+        dfs = list(map(_read_one, files, *args))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            dfs = list(executor.map(_read_one, files, *args))
+
+    # Add identifier columns as categoricals, without creating a string
+    # per row.
+    for column, name_from in (('user', user_from), ('group', group_from)):
+        if name_from is None:
+            continue
+        names = [_name_from_path(f, name_from) for f in files]
+        categories = pd.Index(sorted(set(names)))
+        for df, name in zip(dfs, names):
+            codes = np.full(len(df), categories.get_loc(name), dtype=np.int32)
+            df[column] = pd.Categorical.from_codes(codes, categories)
+
+    # Categories differ between files, concatenate with their union.
+    return util.concat(dfs)
@@ -0,0 +1,140 @@
+"""Column types of known sensor tables.
+
+Data read from sqlite (and csv) comes with whatever types pandas infers:
+Aware status columns are often stored as text and come back as `object`
+strings, and identifier columns are plain Python strings repeated on
+every row.  The schemas here give compact types for the columns of known
+tables, which are applied while reading (`read_sqlite(..., schema=True)`,
+`read_csv(..., schema=True)`).
+
+Integer columns which contain missing values can not be stored as
+integers, and are converted to float32 instead.  Integer columns with
+values outside the range of their type are converted to int64.
+
+The `time` column is left as unixtime: the datetime is already
+available as the index.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Identifier columns, in all tables
+ID_COLUMNS = {
+    'user': 'category',
+    'device': 'category',
+    'group': 'category',
+}
+
+# Sensor columns, per table
+SCHEMAS = {
+    'AwareScreen': {
+        'screen_status': 'int8',
+    },
+    'AwareBattery': {
+        'battery_level': 'int8',
+        'battery_status': 'int8',
+        'battery_health': 'int8',
+        'battery_adaptor': 'int8',
+    },
+    'AwareCalls': {
+        'call_type': 'category',
+        'call_duration': 'float32',
+    },
+    'AwareMessages': {
+        'message_type': 'category',
+    },
+    'AwareAudio': {
+        'is_silent': 'int8',
+        'double_decibels': 'float32',
+        'double_frequency': 'float32',
+    },
+    'gps': {
+        'double_latitude': 'float64',
+        'double_longitude': 'float64',
+        'double_speed': 'float32',
+    },
+}
+
+
+def get_schema(table):
+    """Return the column types of a table, including identifier columns.
+
+    Unknown tables only have the identifier column types.
+    """
+    schema = dict(ID_COLUMNS)
+    schema.update(SCHEMAS.get(table, {}))
+    return schema
+
+
+def guess_table(filename):
+    """Return the known table name within a file name, or None.
+
+    For example "multiuser_AwareBattery.csv" is "AwareBattery".
+    """
+    if not isinstance(filename, (str, os.PathLike)):
+        return None
+    basename = os.path.basename(filename)
+    for table in SCHEMAS:
+        if table in basename:
+            return table
+    return None
+
+
+def parser_dtypes(schema):
+    """Return the dtypes of a schema which can be given to a csv parser.
+
+    Integer columns are left out, since the parser can not read missing
+    values into them.  These are converted by apply_schema() instead.
+    """
+    dtypes = {}
+    for column, dtype in schema.items():
+        dtype = pd.api.types.pandas_dtype(dtype)
+        if isinstance(dtype, pd.CategoricalDtype) or not np.issubdtype(dtype, np.integer):
+            dtypes[column] = dtype
+    return dtypes
+
+
+def convert_column(series, dtype):
+    """Convert a single column to the given dtype."""
+    dtype = pd.api.types.pandas_dtype(dtype)
+    if series.dtype == dtype:
+        return series
+    if isinstance(dtype, pd.CategoricalDtype):
+        return series.astype(dtype)
+    if not pd.api.types.is_numeric_dtype(series.dtype):
+        series = pd.to_numeric(series, errors='coerce')
+    if np.issubdtype(dtype, np.integer):
+        if series.isna().any():
+            return series.astype('float32')
+        info = np.iinfo(dtype)
+        if len(series) and (series.min() < info.min or series.max() > info.max):
+            # Values do not fit, keep them in a wide type
+            return series.astype('int64')
+    return series.astype(dtype)
+
+
+def apply_schema(df, schema):
+    """Convert columns of a DataFrame according to a schema.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Data to convert.  Columns are replaced in-place.
+
+    schema : str or dict
+        Either a table name (see `SCHEMAS`), or a dict of column name
+        -> dtype.  Columns not in the dataframe are ignored.
+
+    Returns
+    -------
+    df : pandas.DataFrame
+    """
+    if isinstance(schema, str):
+        schema = get_schema(schema)
+    for column, dtype in schema.items():
+        if column in df:
+            df[column] = convert_column(df[column], dtype)
+    return df
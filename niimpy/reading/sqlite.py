@@ -3,11 +3,13 @@
 
 import warnings
 
+from niimpy.reading import cache as cache_
 from niimpy.reading import database
+from niimpy.reading import schema as schema_
 from niimpy.preprocessing import util
 
 
-def read_sqlite(filename, table, add_group=None, user=database.ALL, limit=None, offset=None, start=None, end=None, tz=None):
+def read_sqlite(filename, table, add_group=None, user=database.ALL, limit=None, offset=None, start=None, end=None, tz=None, chunksize=None, partition_by=None, schema=None, cache=False, compact=False):
     """Read DataFrame from sqlite3 database
 
     This will read data from a sqlite3 file, taking sensor data in a
@@ -41,13 +43,67 @@ def read_sqlite(filename, table, add_group=None, user=database.ALL, limit=None,
 
     end : int or float or str or datetime.datetime, optional
         Same meaning as 'start', but for end time
+
+    chunksize : int, optional
+        If given, return an iterator of DataFrames of at most this many
+        rows each, ordered by time, instead of reading all data at once.
+
+    partition_by : str, optional
+        If "user", return an iterator of (user, DataFrame) pairs, reading
+        the data of only one user at a time.
+
+    schema : bool or dict, optional
+        If True, convert columns to compact types as given by
+        `niimpy.reading.schema.SCHEMAS` for this table (identifier
+        columns to categorical, sensor columns to small numeric types).
+        If a dict of column name -> dtype, use that instead.
+
+    cache : bool
+        If True, cache the result on disk, see `niimpy.reading.cache`.
+        Not used with `chunksize` or `partition_by`.
+
+    compact : bool
+        If True, keep the times only as the index, without the 'time'
+        and 'datetime' columns (see `niimpy.util.df_normalize`).  These
+        can be added back with `niimpy.util.expand_time`.
     """
     if tz is None:
         warnings.warn(DeprecationWarning("From now on, you should explicitely specify timezone with e.g. tz='Europe/Helsinki'"), stacklevel=2)
+    # Resolve the timezone once, all times of this read are converted
+    # to it (see util.get_tz).
+    tz = util.get_tz(tz)
+
+    if partition_by not in (None, 'user'):
+        raise ValueError("partition_by must be None or 'user', not {!r}".format(partition_by))
+    if partition_by is not None and chunksize is not None:
+        raise ValueError("chunksize and partition_by can not be used together")
+
+    if cache and chunksize is None and partition_by is None:
+        return cache_.cached(filename, ('sqlite', table, add_group, user, limit, offset, start, end, tz, schema, compact),
+                             lambda: read_sqlite(filename, table, add_group=add_group, user=user, limit=limit,
+                                                 offset=offset, start=start, end=end, tz=tz, schema=schema,
+                                                 compact=compact))
+
+    if schema is True:
+        schema = table
+
+    def preprocess(df):
+        df = util.read_preprocess(df, add_group=add_group)
+        if schema:
+            df = schema_.apply_schema(df, schema)
+        return df
 
     db = database.Data1(filename, tz=tz)
-    df = db.raw(table, user, limit=limit, offset=offset, start=start, end=end)
-    df = util.read_preprocess(df, add_group=add_group)
+    if partition_by == 'user':
+        users = None if user is database.ALL else [user]
+        parts = db.iter_users(table, users=users, start=start, end=end, compact=compact)
+        return ((user_, preprocess(df)) for user_, df in parts)
+    if chunksize is not None:
+        chunks = db.iter_raw(table, user, chunksize=chunksize, limit=limit, offset=offset, start=start, end=end,
+                             compact=compact)
+        return (preprocess(df) for df in chunks)
+    df = db.raw(table, user, limit=limit, offset=offset, start=start, end=end, compact=compact)
+    df = preprocess(df)
     return df
 
 
@@ -0,0 +1,228 @@
+"""Columnar dataset store of normalized sensor data.
+
+Reading csv files or sqlite databases and normalizing the result is
+repeated every time an analysis is run.  A `Store` keeps normalized
+DataFrames (as returned by the readers) in a directory of Parquet files,
+partitioned by table, user and month::
+
+    path/table=AwareBattery/user=jd9INuQ5BBlW/month=2020-01/part-0.parquet
+
+Data is opened lazily and memory-mapped.  Filters on user and time are
+pushed down to the dataset, so that only the files of the selected
+users and months are read, which makes loading a subset of a cohort
+fast::
+
+    store = niimpy.store.open('study.niimpy')
+    store.write('AwareBattery', niimpy.read_sqlite(db, 'AwareBattery', tz=TZ))
+    df = store.read('AwareBattery', user='jd9INuQ5BBlW', start='2020-01-01', tz=TZ)
+    for user, df in store.iter_users('AwareBattery', tz=TZ):
+        ...
+
+Times are stored in UTC (months are UTC months) and converted to the
+requested timezone when read.
+"""
+
+import numbers
+import os
+from urllib.parse import quote, unquote
+
+import pandas as pd
+import pyarrow
+import pyarrow.dataset as ds
+import pyarrow.fs
+
+from niimpy.preprocessing import util
+
+# Column of the stored index.
+TIME_COLUMN = '_timestamp'
+
+PARTITIONING = ds.partitioning(
+    pyarrow.schema([('table', pyarrow.string()), ('user', pyarrow.string()), ('month', pyarrow.string())]),
+    flavor='hive')
+
+
+def open(path):
+    """Open a dataset store, see `Store`."""
+    return Store(path)
+
+
+def _timestamp(value, tz):
+    """Convert a start/end limit to a UTC pandas.Timestamp."""
+    # Numbers, including numpy scalars, are unixtimes in seconds
+    if isinstance(value, numbers.Number) and not isinstance(value, bool):
+        return pd.Timestamp(value, unit='s', tz='UTC')
+    value = pd.Timestamp(value)
+    if value.tzinfo is None:
+        value = value.tz_localize(tz)
+    return value.tz_convert('UTC')
+
+
+class Store(object):
+    """A directory of normalized sensor data, partitioned by table, user and month.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the store.  It is created on the first write.
+    """
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        self._filesystem = pyarrow.fs.LocalFileSystem(use_mmap=True)
+
+    def tables(self):
+        """Return the set of tables in the store."""
+        if not os.path.isdir(self.path):
+            return set()
+        return {unquote(name.split('=', 1)[1]) for name in os.listdir(self.path) if name.startswith('table=')}
+
+    def users(self, table):
+        """Return the set of users of a table."""
+        path = os.path.join(self.path, 'table='+quote(table, safe=''))
+        if not os.path.isdir(path):
+            return set()
+        partitions = (name.split('=', 1)[1] for name in os.listdir(path) if name.startswith('user='))
+        return {unquote(p) for p in partitions}
+
+    def write(self, table, df, user=None):
+        """Write a normalized DataFrame into the store.
+
+        Data of the same table, users and months which already exists in
+        the store is replaced.
+
+        Parameters
+        ----------
+        table : str
+            Table name, such as "AwareBattery".
+
+        df : pandas.DataFrame
+            Data with a DatetimeIndex, as returned by the readers.  If
+            there is no 'user' column, `user` must be given.
+
+        user : str, optional
+            User of all rows, for single-user data.
+        """
+        if not isinstance(df.index, pd.DatetimeIndex):
+            raise ValueError("Data to store must have a DatetimeIndex")
+        if 'user' not in df and user is None:
+            raise ValueError("Data without a 'user' column needs the user argument")
+
+        index = df.index
+        if index.tz is None:
+            index = index.tz_localize(util.get_tz())
+        index = index.tz_convert('UTC')
+        # The 'datetime' column is a copy of the index, and is restored
+        # when reading.
+        df = df.drop(columns=['datetime', 'table', 'month'], errors='ignore')
+        df = df.reset_index(drop=True)
+        df[TIME_COLUMN] = index
+        if user is not None:
+            df['user'] = user
+        df['user'] = df['user'].astype(str)
+        df['table'] = table
+        df['month'] = index.strftime('%Y-%m')
+
+        ds.write_dataset(pyarrow.Table.from_pandas(df, preserve_index=False), self.path,
+                         format='parquet', partitioning=PARTITIONING,
+                         existing_data_behavior='delete_matching',
+                         basename_template='part-{i}.parquet')
+
+    def dataset(self, table):
+        """Return the pyarrow.dataset.Dataset of a table.
+
+        Nothing is read until the dataset is scanned.
+        """
+        if table not in self.tables():
+            raise ValueError("No table {!r} in store {}".format(table, self.path))
+        return ds.dataset(os.path.join(self.path, 'table='+quote(table, safe='')), format='parquet',
+                          partitioning=ds.partitioning(pyarrow.schema([('user', pyarrow.string()),
+                                                                       ('month', pyarrow.string())]),
+                                                       flavor='hive'),
+                          filesystem=self._filesystem)
+
+    def _filter(self, user=None, start=None, end=None, tz=None):
+        """Return the dataset filter expression of the limits."""
+        expr = None
+        def and_(e):
+            return e if expr is None else expr & e
+        if user is not None:
+            users = [user] if isinstance(user, str) else list(user)
+            expr = and_(ds.field('user').isin(users))
+        if start is not None:
+            start = _timestamp(start, tz)
+            expr = and_((ds.field('month') >= start.strftime('%Y-%m'))
+                        & (ds.field(TIME_COLUMN) >= pyarrow.scalar(start, pyarrow.timestamp('ns', 'UTC'))))
+        if end is not None:
+            end = _timestamp(end, tz)
+            expr = and_((ds.field('month') <= end.strftime('%Y-%m'))
+                        & (ds.field(TIME_COLUMN) < pyarrow.scalar(end, pyarrow.timestamp('ns', 'UTC'))))
+        return expr
+
+    def read(self, table, user=None, start=None, end=None, columns=None, tz=None, compact=False):
+        """Read data of a table.
+
+        Parameters
+        ----------
+        table : str
+            Table name.
+
+        user : str or list of str, optional
+            If given, read only these users.
+
+        start : int or float or str or datetime.datetime, optional
+            If given, limit to this starting time.  Formats are as in
+            `read_sqlite`.  Times without a timezone are in `tz`.
+
+        end : int or float or str or datetime.datetime, optional
+            Same meaning as 'start', but for end time.  Rows at the end
+            time are not included, as in `read_sqlite`.
+
+        columns : list of str, optional
+            If given, read only these columns (and the identifier columns).
+
+        tz : str
+            Timezone of the result.
+
+        compact : bool
+            If True, do not add the 'datetime' column (see
+            `niimpy.util.df_normalize`).
+
+        Returns
+        -------
+        df : pandas.DataFrame
+            Data in time order per file, indexed by time, with
+            categorical identifier columns.
+        """
+        tz = util.get_tz(tz)
+        dataset = self.dataset(table)
+        if columns is not None:
+            columns = [c for c in dataset.schema.names
+                       if c in columns or c in util.ID_COLUMNS or c == TIME_COLUMN]
+        data = dataset.to_table(columns=columns, filter=self._filter(user, start, end, tz))
+        return self._to_pandas(data, tz, compact)
+
+    def iter_users(self, table, users=None, start=None, end=None, columns=None, tz=None, compact=False):
+        """Iterate over data of a table, one user at a time.
+
+        Yields (user, DataFrame) pairs, like `Data1.iter_users`.  Only
+        the files of one user are read at once.  Arguments are as in
+        `read`.
+        """
+        if users is None:
+            users = sorted(self.users(table))
+        for user in users:
+            yield user, self.read(table, user=user, start=start, end=end, columns=columns, tz=tz, compact=compact)
+
+    def _to_pandas(self, data, tz, compact):
+        """Convert a scanned pyarrow Table to a normalized DataFrame."""
+        df = data.to_pandas()
+        df.index = pd.DatetimeIndex(df.pop(TIME_COLUMN)).tz_convert(tz)
+        df.index.name = None
+        df.drop(columns=['month'], inplace=True, errors='ignore')
+        # Partition columns come last, restore the original column order.
+        metadata = data.schema.pandas_metadata
+        if metadata:
+            order = [c['name'] for c in metadata['columns'] if c['name'] in df]
+            df = df[order + [c for c in df.columns if c not in order]]
+        if not compact:
+            df['datetime'] = df.index
+        return util.to_categorical(df)
@@ -5,6 +5,7 @@ import pytest
 
 import niimpy
 from niimpy.preprocessing.util import TZ
+from niimpy import config
 
 df11 = pd.DataFrame(
     {"user": ['wAzQNrdKZZax'] * 3 + ['Afxzi7oI0yyp'] * 3 + ['lb983ODxEFUD'] * 4,
@@ -76,3 +77,13 @@ def test_battery_charge_discharge():
     chdisch_user = chdisch[chdisch["user"] == "lb983ODxEFUD"]
     assert chdisch_user.loc[Timestamp('2019-01-17 10:30:00+02:00')]['charge/discharge'] == -0.001050474788377773
     assert chdisch_user.loc[Timestamp('2019-01-17 10:30:00+02:00'), 'group'] =="group1"
+
+
+def test_battery_occurrences_compact():
+    # Reading with compact=True gives the same features.
+    data = niimpy.read_csv(config.MULTIUSER_AWARE_BATTERY_PATH, tz='Europe/Helsinki')
+    compact = niimpy.read_csv(config.MULTIUSER_AWARE_BATTERY_PATH, tz='Europe/Helsinki', compact=True)
+    k = niimpy.preprocessing.battery.battery_occurrences
+    expected = niimpy.preprocessing.battery.extract_features_battery(data, features={k: {}})
+    result = niimpy.preprocessing.battery.extract_features_battery(compact, features={k: {}})
+    pd.testing.assert_frame_equal(result, expected)
@@ -1,4 +1,8 @@
+import collections
+
 import numpy as np
+import pandas as pd
+import pytest
 
 from geopy.distance import distance
 
@@ -7,7 +11,7 @@ import niimpy.preprocessing.location as nilo
 from niimpy import config
 
 # read sample data
-data = niimpy.read_csv(config.GPS_PATH, tz='et')
+data = niimpy.read_csv(config.GPS_PATH, tz='Europe/Helsinki')
 data = data.rename(columns={"double_latitude": "latitude", "double_longitude": "longitude", "double_speed": "speed"})
 data["group"] = "group1"
 
@@ -31,6 +35,25 @@ def test_distance_matrix():
     assert (error_percentage < 0.01).all() # error percentage must be below 1%
     
 
+def test_distance_matrix_blocks(tmp_path):
+    df = data[data['user'] == 'gps_u00']
+    lats, lons = df['latitude'].to_numpy()[:300], df['longitude'].to_numpy()[:300]
+    dists = nilo.distance_matrix(lats, lons)
+
+    assert np.array_equal(nilo.distance_matrix(lats, lons, block_size=7), dists)
+    dists32 = nilo.distance_matrix(lats, lons, dtype=np.float32, block_size=64)
+    assert dists32.dtype == np.float32
+    assert np.array_equal(dists32, dists.astype(np.float32))
+
+    out = np.lib.format.open_memmap(tmp_path / 'dists.npy', 'w+', np.float64, dists.shape)
+    assert nilo.distance_matrix(lats, lons, out=out, block_size=100) is out
+    out.flush()
+    assert np.array_equal(np.load(tmp_path / 'dists.npy'), dists)
+
+    with pytest.raises(ValueError):
+        nilo.distance_matrix(lats, lons, out=np.empty((3, 3)))
+
+
 def test_location_features():
     # extract featuers
     data["extra_column"] = "extra"
@@ -68,3 +91,94 @@ def test_location_features():
     assert features_u1['group'] == "group1"
 
 
+def test_point_distances():
+    lats1 = [60.186914007399274, 60.167290738174195, 61.49603247041282, 0, -33]
+    lons1 = [24.82159342608858, 24.941127948645796, 23.75945568751852, 0, 151]
+    lats2 = [60.167290738174195, 61.49603247041282, 61.49603247041282, 0.5, 40]
+    lons2 = [24.941127948645796, 23.75945568751852, 23.75945568751852, 179.7, -74]
+    true_dists = [distance((a, b), (c, d)).meters for a, b, c, d in zip(lats1, lons1, lats2, lons2)]
+
+    dists = nilo.point_distances(lats1, lons1, lats2, lons2)
+    assert np.abs(dists - true_dists).max() < 1e-3
+
+    dists = nilo.point_distances(lats1, lons1, lats2, lons2, distance_method='haversine')
+    assert (np.abs(dists - true_dists) <= 0.005 * np.array(true_dists)).all()
+
+    with pytest.raises(ValueError):
+        nilo.point_distances(lats1, lons1, lats2, lons2, distance_method='euclidean')
+
+    # A missing coordinate gives a missing distance, and the others are
+    # computed as usual.
+    dists = nilo.point_distances(lats1 + [np.nan], lons1 + [24.9], lats2 + [60.2], lons2 + [24.9])
+    assert np.isnan(dists[-1])
+    assert np.abs(dists[:-1] - true_dists).max() < 1e-3
+
+
+def test_get_speeds_totaldist():
+    df = data[data['user'] == 'gps_u00'].sort_index().iloc[:200]
+    lats, lons, times = df['latitude'], df['longitude'], df.index
+    speeds, total_dist = nilo.get_speeds_totaldist(lats, lons, times)
+
+    dists = [0] + [distance((lats.iloc[i-1], lons.iloc[i-1]), (lats.iloc[i], lons.iloc[i])).meters
+                   for i in range(1, len(df))]
+    seconds = [1] + [(times[i] - times[i-1]).total_seconds() for i in range(1, len(df))]
+    assert np.abs(total_dist - sum(dists)) < 1e-3
+    assert np.allclose(speeds[1:], (np.array(dists) / np.array(seconds))[1:])
+    assert speeds[0] == 0
+
+
+def test_cluster_locations_sparse():
+    # The sparse neighbor graph gives the same clusters as the full
+    # distance matrix.
+    from sklearn.cluster import DBSCAN
+    df = data[data['user'] == 'gps_u00']
+    lats, lons = df['latitude'].to_numpy()[:1500], df['longitude'].to_numpy()[:1500]
+
+    graph = nilo.radius_neighbors_graph(lats[:500], lons[:500], 200)
+    dists = nilo.distance_matrix(lats[:500], lons[:500])
+    assert graph.nnz == (dists <= 200).sum()
+    assert np.array_equal(graph.toarray()[dists <= 200], dists[dists <= 200])
+
+    for eps in [20, 200]:
+        dense = DBSCAN(min_samples=5, eps=eps, metric='precomputed').fit_predict(nilo.distance_matrix(lats, lons))
+        assert np.array_equal(nilo.cluster_locations(lats, lons, eps=eps), dense)
+
+
+def test_home_features():
+    df = data[data['user'] == 'gps_u00'].sort_index()
+    lats, lons, times = df['latitude'], df['longitude'], df.index
+
+    lat_home, lon_home = nilo.find_home(lats, lons, times)
+    night = [t.hour <= 6 for t in times]
+    clusters = nilo.cluster_locations(lats[night], lons[night])
+    home = clusters == collections.Counter(clusters).most_common()[0][0]
+    assert lat_home == np.mean(lats[night][home])
+    assert lon_home == np.mean(lons[night][home])
+    assert nilo.find_home(lats, lons, list(times)) == (lat_home, lon_home)
+    assert np.isnan(nilo.find_home(lats[:0], lons[:0], times[:0])).all()
+
+    dists = [distance((lat, lon), (lat_home, lon_home)).meters for lat, lon in zip(lats[:500], lons[:500])]
+    n_home, max_dist_home = nilo.compute_nbin_maxdist_home(lats[:500], lons[:500], (lat_home, lon_home))
+    assert n_home == sum(d <= 50 for d in dists)
+    assert np.abs(max_dist_home - max(dists)) < 1e-3
+    assert nilo.compute_nbin_maxdist_home(lats[:0], lons[:0], (lat_home, lon_home)) == (0, 0)
+    assert np.isnan(nilo.compute_nbin_maxdist_home(lats, lons, (np.nan, np.nan))).all()
+
+
+def test_extract_features_location_one_pass():
+    # Features computed in one pass are the same as computed separately,
+    # also with empty windows and computed speeds.
+    df = data[(data.index.day < 10) | (data.index.day > 20)].drop(columns=["speed"])
+    features = {
+        nilo.location_significant_place_features: {"longitude_column": "longitude", "resample_args": {"rule": "1D"}},
+        nilo.location_distance_features: {"longitude_column": "longitude", "resample_args": {"rule": "1D"}},
+        nilo.number_of_significant_places: {"resample_args": {"rule": "1D"}},
+    }
+    result = nilo.extract_features_location(df, features=features)
+
+    separate = []
+    for function, arguments in features.items():
+        separate.append(niimpy.util.set_conserved_index(function(df, **arguments)))
+    separate = niimpy.util.reset_groups(pd.concat(separate, axis=1))
+    assert result["n_significant_places"].dtype == np.int64
+    pd.testing.assert_frame_equal(result.sort_index(axis=1), separate.sort_index(axis=1))
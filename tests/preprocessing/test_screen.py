@@ -15,6 +15,8 @@ def test_audio_features():
     data["extra_column"] = "extra"
     test = sc.extract_features_screen(data, bat, features=None)
     assert "extra_column" not in test.columns
+    assert test["user"].dtype == "category"
+    assert test["device"].dtype == "category"
 
     time = pd.Timestamp("2020-01-09 02:30:00", tz='Europe/Helsinki')
     
@@ -47,3 +47,70 @@ def test_aggregate_correct_frequency():
     
     m = res_df.loc[[pd.Timestamp('2022-01-01 00:00:00'), pd.Timestamp('2022-01-01 01:00:00')]].index
     np.testing.assert_array_equal(res_df.index , m)
+
+
+def test_df_normalize_day_hour():
+    df = pd.DataFrame({'day': ['2020-03-01', '2020-03-01', '2020-03-02'], 'hour': [0, 23, 5], 'x': [1, 2, 3]})
+    niimpy.util.df_normalize(df, tz='Europe/Helsinki')
+    assert list(df.index) == [pd.Timestamp('2020-03-01 00:00', tz='Europe/Helsinki'),
+                              pd.Timestamp('2020-03-01 23:00', tz='Europe/Helsinki'),
+                              pd.Timestamp('2020-03-02 05:00', tz='Europe/Helsinki')]
+    assert df.index.name is None
+
+
+def test_categorical_id_columns():
+    df = pd.DataFrame({'user': ['u1', 'u2', 'u1'], 'device': ['d1', 'd2', 'd1'], 'x': [1, 2, 3]},
+                      index=pd.date_range('2020-01-01', periods=3, freq='h'))
+    df = niimpy.util.read_preprocess(df, add_group='g1')
+    for column in ['user', 'device', 'group']:
+        assert df[column].dtype == 'category'
+
+    # Only existing user/device combinations are groups
+    result = niimpy.util.group_data(df)['x'].sum()
+    assert len(result) == 2
+    result = niimpy.util.reset_groups(result.to_frame())
+    assert result['user'].dtype == 'category'
+
+
+def test_set_encoding():
+    garbled = 'Hyvää päivää'.encode('utf-8').decode('iso-8859-1')
+    df = pd.DataFrame({'text': [garbled, None, garbled, 'abc'],
+                       'app': pd.Categorical([garbled, 'abc', garbled, 'abc']),
+                       'x': [1, 2, 3, 4]})
+    df = niimpy.util.set_encoding(df)
+    assert list(df['text']) == ['Hyvää päivää', None, 'Hyvää päivää', 'abc']
+    assert df['app'].dtype == 'category'
+    assert list(df['app']) == ['Hyvää päivää', 'abc', 'Hyvää päivää', 'abc']
+    assert list(df['x']) == [1, 2, 3, 4]
+
+    df = pd.DataFrame({'text': [garbled, 'abc']})
+    df = niimpy.util.set_encoding(df, dtype='string[pyarrow]')
+    assert df['text'].dtype == 'string[pyarrow]'
+    assert df['text'][0] == 'Hyvää päivää'
+
+    df = pd.DataFrame({'a': [None, None], 'b': [garbled, None]})
+    df = niimpy.util.set_encoding(df)
+    assert list(df['a']) == [None, None]
+    assert list(df['b']) == ['Hyvää päivää', None]
+
+
+def test_format_column_names():
+    from niimpy.reading import util as reading_util
+    df = pd.DataFrame(columns=['Temperature (C)', 'fitValue.value.fpVal', 'A  b/c'])
+    reading_util.format_column_names(df)
+    assert list(df.columns) == ['temperature_(c)', 'fitvalue_value_fpval', 'a__b/c']
+
+
+def test_concat():
+    df1 = pd.DataFrame({'user': pd.Categorical(['u1', 'u2']), 'x': [1, 2]})
+    df2 = pd.DataFrame({'user': pd.Categorical(['u3', 'u1']), 'x': [3, 4]})
+    df3 = pd.DataFrame({'user': ['u4'], 'group': ['g1'], 'x': [5]})
+    df = niimpy.util.concat([df1, df2, df3])
+    assert df['user'].dtype == 'category'
+    assert list(df['user'].cat.categories) == ['u1', 'u2', 'u3', 'u4']
+    assert list(df['user']) == ['u1', 'u2', 'u3', 'u1', 'u4']
+    assert df['group'].dtype == 'category'
+    assert list(df['x']) == [1, 2, 3, 4, 5]
+    # The inputs are not modified
+    assert list(df2['user'].cat.categories) == ['u1', 'u3']
+    assert df3['user'].dtype == object
@@ -1,12 +1,16 @@
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import os
 import pandas as pd
+import shutil
+import sqlite3
 import time
 
 import pytest
 
 import niimpy
 from niimpy import config
+from niimpy.reading import database
 
 DATA = config.SQLITE_SINGLEUSER_PATH
 
@@ -167,3 +171,225 @@ def test_df_normalize():
     print(df)
     assert df['x']['2018-01-01 03:00:00'] == 3
     assert df.index[1].hour == 3
+
+def test_iter_raw():
+    data = niimpy.open(DATA, tz=TZ)
+    chunks = list(data.iter_raw('AwareScreen', user=niimpy.ALL, chunksize=100))
+    assert len(chunks) == 12
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    df = pd.concat(chunks)
+    assert len(df) == 1156
+    assert df.index.is_monotonic_increasing
+    assert isinstance(df.index, pd.DatetimeIndex)
+    assert 'datetime' in df
+
+    chunks = list(data.iter_raw('AwareScreen', user=niimpy.ALL, chunksize=100, start="2018-07-11", end="2018-07-12"))
+    assert sum(len(chunk) for chunk in chunks) == 163
+
+def test_iter_users():
+    data = niimpy.open(niimpy.sampledata.MULTIUSER, tz=TZ)
+    df = data.raw('AwareScreen', user=niimpy.ALL)
+    parts = dict(data.iter_users('AwareScreen'))
+    assert set(parts) == data.users('AwareScreen')
+    for user, part in parts.items():
+        assert (part['user'] == user).all()
+        assert len(part) == (df['user'] == user).sum()
+        assert part.index.is_monotonic_increasing
+
+    # Single-user databases return everything at once
+    data = niimpy.open(DATA, tz=TZ)
+    parts = list(data.iter_users('AwareScreen'))
+    assert len(parts) == 1
+    assert parts[0][0] is None
+    assert len(parts[0][1]) == 1156
+
+def test_ensure_indexes(tmp_path):
+    db = str(tmp_path / 'multiuser.sqlite3')
+    shutil.copy(niimpy.sampledata.MULTIUSER, db)
+
+    data = niimpy.open(db, tz=TZ)
+    plan = data.explain('AwareBattery', user='jd9INuQ5BBlW', start='2019-01-01')
+    assert not plan['detail'].str.contains('USING INDEX').any()
+
+    data = niimpy.open(db, tz=TZ, ensure_indexes=True)
+    plan = data.explain('AwareBattery', user='jd9INuQ5BBlW', start='2019-01-01')
+    assert plan['detail'].str.contains('AwareBattery_user_time').any()
+    # Indexes are not re-created
+    data.ensure_indexes()
+    assert len(data.raw('AwareBattery', user='jd9INuQ5BBlW')) > 0
+
+def test_metadata_cache(tmp_path):
+    db = str(tmp_path / 'multiuser.sqlite3')
+    shutil.copy(niimpy.sampledata.MULTIUSER, db)
+
+    data = niimpy.open(db, tz=TZ)
+    assert data.users() == {'jd9INuQ5BBlW'}
+    counts = data.user_table_counts()
+    n = counts.loc['AwareScreen', 'jd9INuQ5BBlW']
+    assert n == len(data.raw('AwareScreen', user=niimpy.ALL))
+
+    # Changes from another connection invalidate the cache
+    conn = sqlite3.connect(db)
+    conn.execute('INSERT INTO AwareScreen (user, device, time, screen_status) VALUES ("new_user", "dev", 1500000000, 1)')
+    conn.commit()
+    conn.close()
+    assert data.users() == {'jd9INuQ5BBlW', 'new_user'}
+    counts = data.user_table_counts()
+    assert counts.loc['AwareScreen', 'jd9INuQ5BBlW'] == n
+    assert counts.loc['AwareScreen', 'new_user'] == 1
+
+def test_hourly_engines():
+    for db, table, column in ((DATA, 'AwareScreen', 'screen_status'),
+                              (niimpy.sampledata.MULTIUSER, 'AwareScreen', 'screen_status'),
+                              (niimpy.sampledata.MULTIUSER, 'AwareBattery', 'battery_level')):
+        data = niimpy.open(db, tz=TZ)
+        for kwargs in ({}, {'limit': 100}, {'start': '2018-07-12'}):
+            sql = data.hourly(table, user=niimpy.ALL, columns=column, engine='sql', **kwargs)
+            vec = data.hourly(table, user=niimpy.ALL, columns=column, engine='pandas', **kwargs)
+            # The sql engine returns None for all-missing std, as object dtype
+            sql[column+'_std'] = sql[column+'_std'].astype(float)
+            pd.testing.assert_frame_equal(sql, vec, check_exact=False)
+    with pytest.raises(ValueError):
+        data.hourly(table, user=niimpy.ALL, engine='numba')
+
+def test_hourly_engines_numeric(tmp_path):
+    db = str(tmp_path / 'numeric.sqlite3')
+    conn = sqlite3.connect(db)
+    conn.execute('CREATE TABLE "Data" ("user", "time", "x")')
+    rows = [('u1', 1531256400 + 600*i, i % 7 + 0.5) for i in range(100)]
+    rows += [('u2', 1531256400 + 900*i, i % 3) for i in range(50)]
+    rows += [('u2', 1531256400, None), ('u2', 1531256401, 'text')]
+    conn.executemany('INSERT INTO "Data" VALUES (?, ?, ?)', rows)
+    conn.commit()
+    conn.close()
+
+    data = niimpy.open(db, tz=TZ)
+    sql = data.hourly('Data', user=niimpy.ALL, columns='x', engine='sql')
+    vec = data.hourly('Data', user=niimpy.ALL, columns='x', engine='pandas')
+    pd.testing.assert_frame_equal(sql, vec, check_exact=False)
+    assert sql['x_std'].notna().all()
+    sql = data.hourly('Data', user='u2', columns='x', engine='sql')
+    vec = data.hourly('Data', user='u2', columns='x', engine='pandas')
+    pd.testing.assert_frame_equal(sql, vec, check_exact=False)
+
+def test_pooled():
+    data = niimpy.open(niimpy.sampledata.MULTIUSER, tz=TZ)
+    pooled = niimpy.open(niimpy.sampledata.MULTIUSER, tz=TZ, pooled=True)
+    tables = sorted(pooled.tables())
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(lambda table: pooled.raw(table, user=niimpy.ALL), tables*4))
+    for table, df in zip(tables*4, results):
+        pd.testing.assert_frame_equal(df, data.raw(table, user=niimpy.ALL))
+
+    # Pooled databases are read-only
+    with pytest.raises(sqlite3.OperationalError):
+        pooled.execute('CREATE TABLE "Test" ("time")')
+    with pytest.raises(ValueError):
+        niimpy.open(niimpy.sampledata.MULTIUSER, tz=TZ, pooled=True, ensure_indexes=True)
+
+def test_aggregate():
+    data = niimpy.open(niimpy.sampledata.MULTIUSER, tz=TZ)
+    raw = data.raw('AwareBattery', user=niimpy.ALL)
+    raw['battery_level'] = pd.to_numeric(raw['battery_level'])
+    for func in ('mean', 'sum', 'count', 'min', 'max'):
+        for rule in ('15min', '1h', '1D'):
+            agg = data.aggregate('AwareBattery', niimpy.ALL, 'battery_level', func=func, rule=rule)
+            expected = raw.groupby('user')['battery_level'].resample(rule).agg(func)
+            expected = expected.to_frame().reset_index('user')
+            pd.testing.assert_frame_equal(agg, expected, check_dtype=False, check_freq=False)
+
+    # Same as util.aggregate
+    agg = data.aggregate('AwareBattery', niimpy.ALL, 'battery_level', func='mean', rule='30min')
+    expected = niimpy.util.aggregate(raw[['user', 'battery_level']], '30min')
+    pd.testing.assert_frame_equal(agg, expected, check_freq=False)
+
+    # A single user of a multi-user database also has the user column
+    user = raw['user'].iloc[0]
+    agg = data.aggregate('AwareBattery', user, 'battery_level', func='mean', rule='30min')
+    expected = niimpy.util.aggregate(raw[raw['user'] == user][['user', 'battery_level']], '30min')
+    pd.testing.assert_frame_equal(agg, expected, check_freq=False)
+
+    with pytest.raises(ValueError):
+        data.aggregate('AwareBattery', niimpy.ALL, 'battery_level', func='median')
+    with pytest.raises(ValueError):
+        data.aggregate('AwareBattery', niimpy.ALL, 'battery_level', rule='1ME')
+
+def test_aggregate_dst(tmp_path):
+    db = str(tmp_path / 'dst.sqlite3')
+    conn = sqlite3.connect(db)
+    conn.execute('CREATE TABLE "Data" ("time", "x")')
+    # Every 20 minutes from 2020-03-27 to 2020-04-01, across the DST change
+    times = range(1585260000, 1585692000, 1200)
+    conn.executemany('INSERT INTO "Data" VALUES (?, ?)', [(t, t % 7) for t in times])
+    conn.commit()
+    conn.close()
+
+    # DST starts at 2020-03-29 01:00 UTC
+    assert database.utcoffsets(TZ, times[0], times[-1]) == [(None, 7200), (1585443600, 10800)]
+
+    data = niimpy.open(db, tz=TZ)
+    raw = data.raw('Data', user=niimpy.ALL)
+    for rule in ('1h', '1D'):
+        agg = data.aggregate('Data', niimpy.ALL, 'x', func='sum', rule=rule)
+        expected = raw[['x']].resample(rule).sum()
+        pd.testing.assert_frame_equal(agg, expected, check_dtype=False, check_freq=False)
+
+def test_occurrence_hourly_machine_timezone():
+    data = niimpy.open(DATA, tz=TZ)
+    occs = data.occurrence('AwareScreen', user=niimpy.ALL)
+    hourly = data.hourly('AwareScreen', user=niimpy.ALL, columns='screen_status')
+    # The timezone of the machine must not matter
+    try:
+        os.environ['TZ'] = 'America/New_York'
+        time.tzset()
+        pd.testing.assert_frame_equal(occs, data.occurrence('AwareScreen', user=niimpy.ALL))
+        pd.testing.assert_frame_equal(hourly, data.hourly('AwareScreen', user=niimpy.ALL, columns='screen_status'))
+    finally:
+        os.environ['TZ'] = TZ
+        time.tzset()
+    # day and hour are local time of the database timezone
+    assert (occs['day'] == occs.index.strftime('%Y-%m-%d')).all()
+    assert (occs['hour'] == occs.index.hour).all()
+
+    data = niimpy.open(niimpy.sampledata.MULTIUSER, tz=TZ)
+    occs = data.occurrence('AwareScreen', user=niimpy.ALL)
+    assert 'user' in occs
+    assert occs['occurrence'].sum() > 0
+
+def test_occurrence_dst(tmp_path):
+    db = str(tmp_path / 'dst.sqlite3')
+    conn = sqlite3.connect(db)
+    conn.execute('CREATE TABLE "Data" ("time", "x")')
+    # Every 10 minutes around the end of DST, 2020-10-25 01:00 UTC
+    conn.executemany('INSERT INTO "Data" VALUES (?, ?)', [(t, 1) for t in range(1603576800, 1603605600, 600)])
+    conn.commit()
+    conn.close()
+
+    data = niimpy.open(db, tz=TZ)
+    occs = data.occurrence('Data', user=niimpy.ALL)
+    hourly = data.hourly('Data', user=niimpy.ALL, columns='x')
+    # The repeated local hour 03:00-04:00 is counted in one row
+    assert occs['count'].sum() == hourly['count'].sum() == 48
+    assert hourly.loc[hourly['hour'] == 3, 'count'].iloc[0] == 12
+    assert occs.index.is_monotonic_increasing
+
+
+def test_tmp_timezone_threads():
+    # The timezone of tmp_timezone is per thread, and the tz argument
+    # always takes precedence over it.
+    def read(tz):
+        with niimpy.util.tmp_timezone(tz):
+            time.sleep(0.01)
+            df = pd.DataFrame({'time': [0]})
+            niimpy.util.df_normalize(df)
+            return df.index[0].hour, niimpy.util.get_tz()
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(read, ['Europe/Helsinki', 'Europe/Berlin', 'UTC', 'Asia/Tokyo']))
+    assert results == [(2, 'Europe/Helsinki'), (1, 'Europe/Berlin'), (0, 'UTC'), (9, 'Asia/Tokyo')]
+
+    with niimpy.util.tmp_timezone('Europe/Berlin'):
+        df = pd.DataFrame({'time': [0]})
+        niimpy.util.df_normalize(df, tz='UTC')
+        assert str(df.index.tz) == 'UTC'
+        assert df['datetime'].iloc[0].hour == 0
+    assert niimpy.util.get_tz() == niimpy.util.TZ
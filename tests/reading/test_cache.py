@@ -0,0 +1,87 @@
+import os
+import shutil
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import niimpy
+from niimpy.reading import cache
+from niimpy.preprocessing import sampledata
+from niimpy import config
+
+TZ = 'Europe/Helsinki'
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    monkeypatch.setattr(cache, 'CACHE_DIR', cache_dir)
+    yield cache_dir
+
+
+def test_read_csv_cache(cache_dir, tmp_path):
+    filename = str(tmp_path / 'battery.csv')
+    shutil.copy(config.MULTIUSER_AWARE_BATTERY_PATH, filename)
+
+    data = niimpy.read_csv(filename, tz=TZ, add_group='group1', cache=True)
+    assert len(os.listdir(cache_dir)) == 1
+    cached = niimpy.read_csv(filename, tz=TZ, add_group='group1', cache=True)
+    assert len(os.listdir(cache_dir)) == 1
+    pd.testing.assert_frame_equal(data, cached)
+    pd.testing.assert_frame_equal(data, niimpy.read_csv(filename, tz=TZ, add_group='group1'))
+
+    # Different arguments or changed files are read again
+    niimpy.read_csv(filename, tz='Europe/Berlin', add_group='group1', cache=True)
+    assert len(os.listdir(cache_dir)) == 2
+    os.utime(filename, ns=(0, 0))
+    niimpy.read_csv(filename, tz=TZ, add_group='group1', cache=True)
+    assert len(os.listdir(cache_dir)) == 3
+
+    niimpy.cache_clear()
+    assert len(os.listdir(cache_dir)) == 0
+
+
+def test_read_sqlite_cache(cache_dir):
+    data = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareBattery', tz=TZ, cache=True)
+    cached = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareBattery', tz=TZ, cache=True)
+    assert len(os.listdir(cache_dir)) == 1
+    pd.testing.assert_frame_equal(data, cached)
+
+    data = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareBattery', tz=TZ, schema=True, cache=True)
+    cached = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareBattery', tz=TZ, schema=True, cache=True)
+    assert len(os.listdir(cache_dir)) == 2
+    pd.testing.assert_frame_equal(data, cached)
+
+
+def test_read_sqlite_cache_wal(cache_dir, tmp_path):
+    # In WAL mode, commits of an open connection do not change the
+    # database file, only the -wal file.
+    db = str(tmp_path / 'wal.sqlite3')
+    conn = sqlite3.connect(db)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA wal_autocheckpoint=0')
+    conn.execute('CREATE TABLE "Data" ("time", "user", "x")')
+    conn.executemany('INSERT INTO "Data" VALUES (?, ?, ?)', [(1600000000 + i, 'u1', i) for i in range(10)])
+    conn.commit()
+    try:
+        assert len(niimpy.read_sqlite(db, table='Data', tz=TZ, cache=True)) == 10
+        stat = os.stat(db)
+        conn.executemany('INSERT INTO "Data" VALUES (?, ?, ?)', [(1600000100 + i, 'u1', i) for i in range(5)])
+        conn.commit()
+        assert (os.stat(db).st_size, os.stat(db).st_mtime_ns) == (stat.st_size, stat.st_mtime_ns)
+        assert len(niimpy.read_sqlite(db, table='Data', tz=TZ, cache=True)) == 15
+    finally:
+        conn.close()
+
+
+def test_cache_eviction(cache_dir, monkeypatch):
+    niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareBattery', tz=TZ, cache=True)
+    size = sum(os.path.getsize(os.path.join(cache_dir, f)) for f in os.listdir(cache_dir))
+    monkeypatch.setattr(cache, 'CACHE_MAX_SIZE', size)
+    niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareBattery', tz=TZ, limit=10, cache=True)
+    # The least recently used file was removed
+    files = os.listdir(cache_dir)
+    assert len(files) == 1
+    niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareBattery', tz=TZ, limit=10, cache=True)
+    assert os.listdir(cache_dir) == files
@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+import pytest
 
 import niimpy
 from niimpy.reading import csv
@@ -14,3 +15,40 @@ def test_read_csv():
     assert isinstance(data.index, pd.DatetimeIndex)
     # There should be a column 'datetime' added in the setup.
     assert 'datetime' in data
+
+def test_read_csv_chunksize():
+    data = niimpy.read_csv(sampledata.SCREEN_MONTH, tz=TZ, add_group='group1')
+    chunks = niimpy.read_csv(sampledata.SCREEN_MONTH, tz=TZ, add_group='group1', chunksize=1000)
+    chunks = list(chunks)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert all(isinstance(chunk.index, pd.DatetimeIndex) for chunk in chunks)
+    pd.testing.assert_frame_equal(pd.concat(chunks), data)
+
+    # Chunks of multi-user data have different categories
+    data = niimpy.read_csv(config.MULTIUSER_AWARE_BATTERY_PATH, tz=TZ)
+    chunks = list(niimpy.read_csv(config.MULTIUSER_AWARE_BATTERY_PATH, tz=TZ, chunksize=100))
+    joined = niimpy.util.concat(chunks)
+    assert joined['user'].dtype == 'category'
+    assert list(joined['user']) == list(data['user'])
+
+def test_read_csv_pyarrow_schema():
+    data = niimpy.read_csv(config.MULTIUSER_AWARE_BATTERY_PATH, tz=TZ)
+    fast = niimpy.read_csv(config.MULTIUSER_AWARE_BATTERY_PATH, tz=TZ, engine='pyarrow', schema=True)
+    assert fast['user'].dtype == 'category'
+    assert fast['battery_level'].dtype == 'int8'
+    assert (fast.index == data.index).all()
+    assert (fast['battery_level'] == data['battery_level']).all()
+
+    # Without pyarrow, the schema is given to the parser
+    data = niimpy.read_csv(config.MULTIUSER_AWARE_CALLS_PATH, tz=TZ, schema=True)
+    assert data['call_type'].dtype == 'category'
+    assert data['call_duration'].dtype == 'float32'
+
+    data = niimpy.read_csv(config.MULTIUSER_AWARE_CALLS_PATH, tz=TZ, schema={'call_duration': 'int32'})
+    assert data['call_duration'].dtype == 'int32'
+    # Identifier columns are categorical even with a custom schema
+    assert data['user'].dtype == 'category'
+
+    with pytest.raises(ValueError):
+        niimpy.read_csv(config.MULTIUSER_AWARE_CALLS_PATH, tz=TZ, engine='pyarrow', chunksize=10)
@@ -0,0 +1,58 @@
+import os
+import shutil
+
+import pytest
+
+import niimpy
+from niimpy.preprocessing import sampledata
+from niimpy import config
+
+TZ = 'Europe/Helsinki'
+
+
+@pytest.fixture
+def study_dir(tmp_path):
+    for group in ('group1', 'group2'):
+        for user in ('u1', 'u2'):
+            os.makedirs(tmp_path / group, exist_ok=True)
+            shutil.copy(sampledata.DATA2_CSV, tmp_path / group / (user + '.csv'))
+    yield tmp_path
+
+
+def test_read_many(study_dir):
+    single = niimpy.read_csv(sampledata.DATA2_CSV, tz=TZ)
+    for n_jobs in (1, 2):
+        data = niimpy.read_many(str(study_dir / '*' / '*.csv'), tz=TZ, user_from='filename',
+                                group_from='dirname', n_jobs=n_jobs)
+        assert len(data) == 4 * len(single)
+        assert data['user'].dtype == 'category'
+        assert data['group'].dtype == 'category'
+        assert sorted(data['user'].cat.categories) == ['u1', 'u2']
+        assert sorted(data['group'].cat.categories) == ['group1', 'group2']
+        assert (data.groupby(['group', 'user'], observed=True).size() == len(single)).all()
+
+    # A list of files, and a function giving the user
+    files = [config.MULTIUSER_AWARE_BATTERY_PATH, sampledata.DATA2_CSV]
+    data = niimpy.read_many(files, tz=TZ, user_from=lambda path: os.path.basename(path)[:5], n_jobs=1)
+    assert set(data['user']) == {'multi', 'Aware'}
+
+
+def test_name_from_path():
+    from niimpy.reading.many import _name_from_path
+    assert _name_from_path('study/p.01.csv', 'filename') == 'p.01'
+    assert _name_from_path('study/p.02.csv.gz', 'filename') == 'p.02'
+    assert _name_from_path('study/jd9.INuQ.sqlite3', 'filename') == 'jd9.INuQ'
+    assert _name_from_path('study/u1', 'filename') == 'u1'
+    assert _name_from_path('study/group1/u1.csv', 'dirname') == 'group1'
+
+    with pytest.raises(ValueError):
+        _name_from_path('study/u1.csv', 'basename')
+
+
+def test_read_many_sqlite():
+    data = niimpy.read_many([sampledata.MULTIUSER], tz=TZ, table='AwareScreen', n_jobs=1)
+    assert data['user'].dtype == 'category'
+    assert data['device'].dtype == 'category'
+    assert len(data) == len(niimpy.read_sqlite(sampledata.MULTIUSER, 'AwareScreen', tz=TZ))
+    with pytest.raises(ValueError):
+        niimpy.read_many([sampledata.MULTIUSER], tz=TZ, n_jobs=1)
@@ -1,5 +1,9 @@
+import pandas as pd
+import pytest
+
 import niimpy
 from niimpy.reading import csv
+from niimpy.reading import schema
 from niimpy.preprocessing import sampledata
 
 TZ = 'Europe/Helsinki'
@@ -9,3 +13,71 @@ def test_read_sqlite():
 
 def test_read_sqlite_tables():
     assert niimpy.read_sqlite_tables(sampledata.DATA) == {'AwareScreen'}
+
+def test_read_sqlite_chunksize():
+    chunks = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareScreen', tz=TZ, add_group='group1', chunksize=50)
+    chunks = list(chunks)
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    assert all((chunk['group'] == 'group1').all() for chunk in chunks)
+    df = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareScreen', tz=TZ)
+    assert sum(len(chunk) for chunk in chunks) == len(df)
+
+def test_read_sqlite_partition_by_user():
+    parts = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareScreen', tz=TZ, add_group='group1', partition_by='user')
+    parts = dict(parts)
+    assert len(parts) > 0
+    for user, df in parts.items():
+        assert (df['user'] == user).all()
+        assert (df['group'] == 'group1').all()
+
+    with pytest.raises(ValueError):
+        niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareScreen', tz=TZ, partition_by='device')
+
+def test_read_sqlite_schema():
+    data = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareBattery', tz=TZ, add_group='group1', schema=True)
+    assert data['user'].dtype == 'category'
+    assert data['device'].dtype == 'category'
+    assert data['group'].dtype == 'category'
+    assert data['battery_level'].dtype == 'int8'
+    assert data['battery_status'].dtype == 'int8'
+    untyped = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareBattery', tz=TZ)
+    assert (data['battery_level'] == pd.to_numeric(untyped['battery_level'])).all()
+
+    data = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareScreen', tz=TZ, schema={'screen_status': 'float32'})
+    assert data['screen_status'].dtype == 'float32'
+    # Identifier columns are categorical even with a custom schema
+    assert data['user'].dtype == 'category'
+
+
+def test_apply_schema_missing_values():
+    df = pd.DataFrame({'user': ['u1', 'u2', 'u1'], 'battery_level': ['1', None, '3']})
+    df = schema.apply_schema(df, 'AwareBattery')
+    assert df['user'].dtype == 'category'
+    # Missing values can not be stored as integers
+    assert df['battery_level'].dtype == 'float32'
+    assert df['battery_level'].isna().sum() == 1
+
+
+def test_convert_column_out_of_range():
+    series = schema.convert_column(pd.Series([300, 5]), 'int8')
+    assert list(series) == [300, 5]
+    assert series.dtype == 'int64'
+    assert schema.convert_column(pd.Series(['-3', '5']), 'int8').dtype == 'int8'
+
+
+def test_read_sqlite_compact():
+    data = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareScreen', tz=TZ)
+    compact = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareScreen', tz=TZ, compact=True)
+    assert 'time' not in compact and 'datetime' not in compact
+    assert compact.index.dtype == data.index.dtype
+    assert compact.index.equals(data.index)
+    assert compact.memory_usage(deep=True).sum() < data.memory_usage(deep=True).sum()
+
+    expanded = niimpy.util.expand_time(compact)
+    assert 'time' not in compact
+    assert (expanded['datetime'] == data['datetime']).all()
+    assert ((expanded['time'] - data['time'].astype(float)).abs() < 1e-6).all()
+    assert niimpy.util.expand_time(data) is data
+
+    chunks = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareScreen', tz=TZ, chunksize=50, compact=True)
+    assert all('time' not in chunk for chunk in chunks)
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import niimpy
+import niimpy.store
+from niimpy.preprocessing import sampledata
+
+TZ = 'Europe/Helsinki'
+
+
+def test_store_roundtrip(tmp_path):
+    store = niimpy.store.open(tmp_path / 'store')
+    assert store.tables() == set()
+    df = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareBattery', tz=TZ)
+    store.write('AwareBattery', df)
+    assert store.tables() == {'AwareBattery'}
+    assert store.users('AwareBattery') == set(df['user'])
+
+    result = store.read('AwareBattery', tz=TZ)
+    assert list(result.columns) == list(df.columns)
+    assert result['user'].dtype == 'category'
+    assert str(result.index.tz) == TZ
+    pd.testing.assert_frame_equal(result.sort_values(['user', 'time']).astype({'user': str, 'device': str}),
+                                  df.sort_values(['user', 'time']).astype({'user': str, 'device': str}))
+
+    compact = store.read('AwareBattery', columns=['battery_level'], tz=TZ, compact=True)
+    assert set(compact.columns) == {'user', 'device', 'battery_level'}
+
+    # Writing the same data again replaces it.
+    store.write('AwareBattery', df)
+    assert len(store.read('AwareBattery', tz=TZ)) == len(df)
+
+
+def test_store_filters(tmp_path):
+    store = niimpy.store.open(tmp_path)
+    df = niimpy.read_sqlite(sampledata.MULTIUSER, table='AwareScreen', tz=TZ)
+    store.write('AwareScreen', df)
+    user = df['user'].iloc[0]
+    start, end = df.index[10], df.index[20]
+
+    result = store.read('AwareScreen', user=user, start=start, end=end, tz=TZ)
+    expected = df[(df['user'] == user) & (df.index >= start) & (df.index < end)]
+    assert sorted(result.index) == sorted(expected.index)
+    # Unixtimes and naive strings (in tz) work too
+    assert len(store.read('AwareScreen', user=user, start=start.timestamp(), end=end.timestamp(), tz=TZ)) == len(expected)
+    # Numpy scalars, such as from df['time'], are unixtimes too
+    t = np.int64(np.ceil(df.index[50].timestamp()))
+    expected = (df.index >= pd.Timestamp(t, unit='s', tz='UTC')).sum()
+    assert 0 < expected < len(df)
+    assert len(store.read('AwareScreen', start=t, tz=TZ)) == expected
+    assert len(store.read('AwareScreen', end=np.float64(t), tz=TZ)) == len(df) - expected
+    assert len(store.read('AwareScreen', start=str(start.tz_localize(None)), tz=TZ)) == (df.index >= start).sum()
+
+    parts = dict(store.iter_users('AwareScreen', tz=TZ))
+    assert set(parts) == set(df['user'])
+    for user, part in parts.items():
+        assert (part['user'] == user).all()
+
+    with pytest.raises(ValueError):
+        store.read('AwareBattery', tz=TZ)
+
+
+def test_store_single_user(tmp_path):
+    store = niimpy.store.open(tmp_path)
+    df = niimpy.read_sqlite(sampledata.DATA, table='AwareScreen', tz=TZ)
+    with pytest.raises(ValueError):
+        store.write('AwareScreen', df)
+    store.write('AwareScreen', df, user='u1')
+    assert store.users('AwareScreen') == {'u1'}
+    assert len(store.read('AwareScreen', user='u1', tz=TZ)) == len(df)
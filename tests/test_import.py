@@ -0,0 +1,41 @@
+import subprocess
+import sys
+
+import pytest
+
+import niimpy
+
+
+# Modules which `import niimpy` must not import, since they are slow to
+# import and only needed by some functions.
+HEAVY_MODULES = ['scipy', 'sklearn', 'geopy', 'tzfpy', 'bs4', 'lxml', 'tqdm', 'google_takeout_email',
+                 'matplotlib', 'seaborn', 'plotly']
+
+CHECK_IMPORT = """
+import sys, time
+import pandas
+start = time.perf_counter()
+import niimpy
+print(time.perf_counter() - start)
+print(' '.join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def test_import_time():
+    output = subprocess.run([sys.executable, '-c', CHECK_IMPORT.format(heavy=HEAVY_MODULES)],
+                            capture_output=True, text=True, check=True).stdout.split('\n')
+    seconds, imported = float(output[0]), output[1]
+    assert imported == ''
+    # Importing niimpy itself (after pandas) should take a fraction of
+    # a second, the limit is generous for slow test machines.
+    assert seconds < 1
+
+
+def test_lazy_attributes():
+    assert niimpy.preprocessing.location.__name__ == 'niimpy.preprocessing.location'
+    assert niimpy.reading.google_takeout.__name__ == 'niimpy.reading.google_takeout'
+    assert niimpy.screen_off is niimpy.preprocessing.screen.screen_off
+    assert 'battery_occurrences' in dir(niimpy)
+    assert 'location' in dir(niimpy.preprocessing)
+    with pytest.raises(AttributeError):
+        niimpy.no_such_attribute